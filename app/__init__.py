@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bootstrap import Bootstrap5
 from app.scripts import setup_logger
 import os
+import multiprocessing
 import logging
 import tzlocal
 import platform
@@ -37,14 +38,22 @@ app.secret_key = '_3:WBH)qdY2WDe-_/h9r6)BD(Mp$SX' #os.urandom(42)
 
 bootstrap = Bootstrap5(app)
 
-db_name = '/config/app.db'
+from app.database import db_name, sqlite_connect
 
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_name
 app.config['SQLALCHEMY_BINDS'] = {
     'db1': 'sqlite:///' + db_name,
 }
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'creator': sqlite_connect,
+    'pool_size': 5,
+    'max_overflow': 10,
+}
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy()
 db.init_app(app)
-from app import routes, api, config, schedule
\ No newline at end of file
+# Image worker processes import this package to reach their jobs in app.module,
+# they don't need the web app and mustn't start another scheduler
+if multiprocessing.parent_process() is None:
+    from app import routes, api, config, schedule
\ No newline at end of file
@@ -8,8 +8,13 @@ import os
 import requests
 import shutil
 from app import scripts 
+from app import module
 from app.schedule import update_scheduler
 from app.routes import log, version
+from app.database import search_index_ready, fts_match
+from app.thumbs import thumb_dir, get_thumbnail
+from app.blobs import prune_blobs
+from sqlalchemy import text, column
 from plexapi.server import PlexServer
 
 date = datetime.datetime.now()
@@ -67,9 +72,9 @@ def run_delete_row(var=''):
 def restore_poster(var=""):
     scripts.restore_single(var)
     message = 'Sent poster to be restored.'
-    config = Plex.query.filter(Plex.id == '1').first()
+    config = module.get_config()
     lib = config.filmslibrary.split(',')
-    plexserver = PlexServer(config.plexurl, config.token)
+    plexserver = module.get_plex_server(config)
     n = len(lib)
     if n >=2:
         for l in range(n):
@@ -86,9 +91,9 @@ def restore_poster(var=""):
 def restore_episode_poster(var=""):
     scripts.restore_episode_from_database(app, var)
     message = 'Sent poster to be restored.'
-    config = Plex.query.filter(Plex.id == '1').first()
+    config = module.get_config()
     lib = config.tvlibrary.split(',')
-    plexserver = PlexServer(config.plexurl, config.token)
+    plexserver = module.get_plex_server(config)
     n = len(lib)
     if n >=2:
         for l in range(n):
@@ -104,9 +109,9 @@ def restore_episode_poster(var=""):
 def restore_season_poster(var=""):
     scripts.restore_single_season(app, var)
     message = 'Sent poster to be restored.'
-    config = Plex.query.filter(Plex.id == '1').first()
+    config = module.get_config()
     lib = config.tvlibrary.split(',')
-    plexserver = PlexServer(config.plexurl, config.token)
+    plexserver = module.get_plex_server(config)
     n = len(lib)
     if n >=2:
         for l in range(n):
@@ -121,9 +126,9 @@ def restore_season_poster(var=""):
 @app.route('/restore/bannered_episode/<path:var>')
 def restore_bannerred_episode_poster(var=""):
     msg = scripts.restore_single_bannered_episode(app, var)
-    config = Plex.query.filter(Plex.id == '1').first()
+    config = module.get_config()
     lib = config.tvlibrary.split(',')
-    plexserver = PlexServer(config.plexurl, config.token)
+    plexserver = module.get_plex_server(config)
     n = len(lib)
     if n >=2:
         for l in range(n):
@@ -142,9 +147,9 @@ def restore_bannerred_episode_poster(var=""):
 @app.route('/restore/bannered_season/<path:var>')
 def restore_bannerred_season_poster(var=""):
     msg = scripts.restore_single_bannered_season(app, var)
-    config = Plex.query.filter(Plex.id == '1').first()
+    config = module.get_config()
     lib = config.tvlibrary.split(',')
-    plexserver = PlexServer(config.plexurl, config.token)
+    plexserver = module.get_plex_server(config)
     n = len(lib)
     if n >=2:
         for l in range(n):
@@ -171,30 +176,17 @@ def restore_bannerred_poster(var=""):
 
 @app.route('/delete_database')
 def delete_database():
-    import sqlite3
-    conn = sqlite3.connect('/config/app.db')
+    from app.database import sqlite_connect, table_schemas, create_search_index
+    conn = sqlite_connect()
     c = conn.cursor()
     c.execute("SELECT * FROM plex_utills")
     query1 = """DROP TABLE films
         """
-    table = """CREATE TABLE "films" (
-            	"ID"	INTEGER NOT NULL UNIQUE,
-            	"Title"	TEXT NOT NULL,
-            	"GUID"	TEXT NOT NULL,
-            	"GUIDS"	TEXT NOT NULL,
-            	"size"	TEXT,
-            	"res"	TEXT,
-            	"hdr"	TEXT,
-            	"audio"	TEXT,
-            	"poster"	TEXT NOT NULL,
-            	"checked"	INTEGER,
-                "bannered_poster" TEXT,
-                "url" TEXT,
-            	PRIMARY KEY("ID" AUTOINCREMENT)
-            ); """
+    table = table_schemas['films']
     c.execute(query1)
     c.execute(table)
     conn.commit()
+    create_search_index(conn, 'films')
     c.close()
     file_paths = '/config/backup/films/'
     for root, dirs, files in os.walk(file_paths):
@@ -208,35 +200,24 @@ def delete_database():
             f = filename
             if f.endswith('.png'):
                 os.remove(file_paths+f)                 
+    for folder in ('films', 'bannered_films'):
+        shutil.rmtree(thumb_dir+folder, ignore_errors=True)
+    prune_blobs()
     return redirect('/films')
 
 @app.route('/delete_tv_database')
 def delete_tv_database():
-    import sqlite3
-    conn = sqlite3.connect('/config/app.db')
+    from app.database import sqlite_connect, table_schemas, create_search_index
+    conn = sqlite_connect()
     c = conn.cursor()
     c.execute("SELECT * FROM plex_utills")
     query1 = """DROP TABLE episodes
         """
-    table = """CREATE TABLE "episodes" (
-            	"ID"	INTEGER NOT NULL UNIQUE,
-                "show_season" TEXT,
-            	"Title"	TEXT NOT NULL,
-            	"GUID"	TEXT NOT NULL,
-            	"GUIDS"	TEXT NOT NULL,
-            	"size"	TEXT,
-            	"res"	TEXT,
-            	"hdr"	TEXT,
-            	"audio"	TEXT,
-            	"poster"	TEXT NOT NULL,
-                "bannered_poster" TEXT,
-            	"checked"	INTEGER,
-                "blurred"    INTEGER,
-            	PRIMARY KEY("ID" AUTOINCREMENT)
-            ); """
+    table = table_schemas['episodes']
     c.execute(query1)
     c.execute(table)
     conn.commit()
+    create_search_index(conn, 'episodes')
     c.close()
 
     file_paths = '/config/backup/tv/episodes/'
@@ -251,28 +232,24 @@ def delete_tv_database():
             f = filename
             if f.endswith('.png'):
                 os.remove(file_paths+f)
+    for folder in ('tv/episodes', 'tv/bannered_episodes'):
+        shutil.rmtree(thumb_dir+folder, ignore_errors=True)
+    prune_blobs()
     return redirect('/episodes')
 
 @app.route('/delete_season_database')
 def delete_season_database():
-    import sqlite3
-    conn = sqlite3.connect('/config/app.db')
+    from app.database import sqlite_connect, table_schemas, create_search_index
+    conn = sqlite_connect()
     c = conn.cursor()
     c.execute("SELECT * FROM plex_utills")
     query1 = """DROP TABLE seasons
         """
-    table = """CREATE TABLE "seasons" (
-                    	"ID"	INTEGER NOT NULL UNIQUE,
-                    	"Title"	TEXT NOT NULL,
-                    	"GUID"	TEXT NOT NULL,
-                        "poster" TEXT,
-                        "bannered_poster" TEXT,
-                        "checked" INTEGER,
-                    	PRIMARY KEY("ID" AUTOINCREMENT)
-                    ); """
+    table = table_schemas['seasons']
     c.execute(query1)
     c.execute(table)
     conn.commit()
+    create_search_index(conn, 'seasons')
     c.close()
 
     file_paths = '/config/backup/tv/seasons/'
@@ -287,6 +264,9 @@ def delete_season_database():
             f = filename
             if f.endswith('.png'):
                 os.remove(file_paths+f)
+    for folder in ('tv/seasons', 'tv/bannered_seasons'):
+        shutil.rmtree(thumb_dir+folder, ignore_errors=True)
+    prune_blobs()
 
     return redirect('/seasons')
 
@@ -344,6 +324,13 @@ def export_support():
     path = 'support.zip'
     return send_file(path, as_attachment=True)
 
+@app.route('/thumbs/<path:name>')
+def thumbs(name):
+    path = get_thumbnail(name)
+    if not path:
+        return 'Not found', 404
+    return send_file(path, mimetype='image/webp', max_age=31536000)
+
 @app.route("/update_schedules", methods=['GET'])
 def update_schedules():
     return update_scheduler()
@@ -357,8 +344,8 @@ def help():
     import shutil 
     from pathlib import PureWindowsPath, PurePosixPath
     file_paths = './app/static/img/tmp/'
-    config = Plex.query.filter(Plex.id == '1').first()
-    plexserver = PlexServer(config.plexurl, config.token)
+    config = module.get_config()
+    plexserver = module.get_plex_server(config)
     lib = config.filmslibrary.split(',')
     for root, dirs, files in os.walk(file_paths):
         for f in files:
@@ -460,21 +447,25 @@ def recently_added():
                 return 'Error', 500
 
 
-@app.route('/api/data')
-def data():
-    query = film_table.query
- 
-    search = request.args.get('search[value]')
+def table_data(table, columns):
+    """Serve a server-side DataTables draw for a table, searching through its FTS5 index"""
+    query = table.query
+    total = module.get_row_count(table)
+
+    search = (request.args.get('search[value]') or '').strip()
     if search:
-        query = query.filter(db.or_(
-            film_table.title.like(f'%{search}%'),
-            film_table.res.like(f'%{search}%'),
-            film_table.hdr.like(f'%{search}%'),
-            film_table.audio.like(f'%{search}%'),
-        ))
- 
-    total_filtered = query.count()
- 
+        match = fts_match(search)
+        if match and search_index_ready(table.__tablename__):
+            fts = table.__tablename__+'_fts'
+            matches = text('SELECT rowid FROM "'+fts+'" WHERE "'+fts+'" MATCH :match').bindparams(match=match)
+            query = query.filter(table.id.in_(matches.columns(column('rowid'))))
+        else:
+            # Words too short for the trigram index, or no index yet, get the plain substring scan
+            query = query.filter(db.or_(*[getattr(table, col).like(f'%{search}%') for col in columns]))
+        total_filtered = query.count()
+    else:
+        total_filtered = total
+
     order = []
     i = 0
     while True:
@@ -482,121 +473,44 @@ def data():
         if col_index is None:
             break
         col_name = request.args.get(f'columns[{col_index}][data]')
-        if col_name not in ['title', 'res', 'hdr', 'audio']:
+        if col_name not in columns:
             col_name = 'title'
         descending = request.args.get(f'order[{i}][dir]') == 'desc'
-        col = getattr(film_table, col_name)
+        col = getattr(table, col_name)
         if descending:
             col = col.desc()
         order.append(col)
         i += 1
     if order:
         query = query.order_by(*order)
- 
+
     start = request.args.get('start', type=int)
     length = request.args.get('length', type=int)
     query = query.offset(start).limit(length)
- 
- 
+
     return {
-        'data': [films.to_dict() for films in query],
+        'data': [row.to_dict() for row in query],
         'recordsFiltered': total_filtered,
-        'recordsTotal': film_table.query.count(),
+        'recordsTotal': total,
         'draw': request.args.get('draw', type=int),
     }
 
+@app.route('/api/data')
+def data():
+    return table_data(film_table, ['title', 'res', 'hdr', 'audio'])
+
 @app.route('/api/episodes')
 def ep_data():
-    query = ep_table.query
- 
-    search = request.args.get('search[value]')
-    if search:
-        query = query.filter(db.or_(
-            ep_table.show_season.like(f'%{search}%'),
-            ep_table.title.like(f'%{search}%'),
-            ep_table.res.like(f'%{search}%'),
-            ep_table.hdr.like(f'%{search}%'),
-            ep_table.audio.like(f'%{search}%')
-        ))
- 
-    total_filtered = query.count()
- 
-    order = []
-    i = 0
-    while True:
-        col_index = request.args.get(f'order[{i}][column]')
-        if col_index is None:
-            break
-        col_name = request.args.get(f'columns[{col_index}][data]')
-        if col_name not in ['title', 'res', 'hdr', 'audio', 'show_season']:
-            col_name = 'title'
-        descending = request.args.get(f'order[{i}][dir]') == 'desc'
-        col = getattr(ep_table, col_name)
-        if descending:
-            col = col.desc()
-        order.append(col)
-        i += 1
-    if order:
-        query = query.order_by(*order)
- 
-    start = request.args.get('start', type=int)
-    length = request.args.get('length', type=int)
-    query = query.offset(start).limit(length)
- 
- 
-    return {
-        'data': [title.to_dict() for title in query],
-        'recordsFiltered': total_filtered,
-        'recordsTotal': ep_table.query.count(),
-        'draw': request.args.get('draw', type=int),
-    }
+    return table_data(ep_table, ['title', 'res', 'hdr', 'audio', 'show_season'])
 
 @app.route('/api/seasons')
 def season_data():
-    query = season_table.query
- 
-    search = request.args.get('search[value]')
-    if search:
-        query = query.filter(db.or_(
-            season_table.title.like(f'%{search}%'),
-        ))
- 
-    total_filtered = query.count()
- 
-    order = []
-    i = 0
-    while True:
-        col_index = request.args.get(f'order[{i}][column]')
-        if col_index is None:
-            break
-        col_name = request.args.get(f'columns[{col_index}][data]')
-        if col_name not in ['title']:
-            col_name = 'title'
-        descending = request.args.get(f'order[{i}][dir]') == 'desc'
-        col = getattr(season_table, col_name)
-        if descending:
-            col = col.desc()
-        order.append(col)
-        i += 1
-    if order:
-        query = query.order_by(*order)
- 
-    start = request.args.get('start', type=int)
-    length = request.args.get('length', type=int)
-    query = query.offset(start).limit(length)
- 
- 
-    return {
-        'data': [title.to_dict() for title in query],
-        'recordsFiltered': total_filtered,
-        'recordsTotal': season_table.query.count(),
-        'draw': request.args.get('draw', type=int),
-    }
+    return table_data(season_table, ['title'])
 
 @app.route('/api/upload/<path:var>')
 def upload_tmdb_posters(var=''):
-    config = Plex.query.filter(Plex.id == '1').first()
-    plexserver = PlexServer(config.plexurl, config.token)
+    config = module.get_config()
+    plexserver = module.get_plex_server(config)
     guid = var.split('&')
     guid = guid[1]
     poster=''
@@ -644,8 +558,8 @@ def upload_tmdb_posters(var=''):
 
 @app.route('/api/process/<path:var>')
 def api_process(var=''):
-    config = Plex.query.filter(Plex.id == '1').first()
-    plexserver = PlexServer(config.plexurl, config.token)
+    config = module.get_config()
+    plexserver = module.get_plex_server(config)
     print(var)
     if 'movie' in var:
         scripts.guid_to_title(app, var)
@@ -670,4 +584,10 @@ def api_process(var=''):
 def migrate():
     from threading import Thread
     Thread(target=scripts.fill_database, args=[app]).start()
-    return render_template('script_log_viewer.html', pagetitle='Migrate', version=version)
\ No newline at end of file
+    return render_template('script_log_viewer.html', pagetitle='Migrate', version=version)
+
+@app.route('/api/store_backups')
+def store_backups():
+    from threading import Thread
+    Thread(target=scripts.store_backups, args=[app]).start()
+    return render_template('script_log_viewer.html', pagetitle='Backup store', version=version)
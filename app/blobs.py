@@ -0,0 +1,97 @@
+import hashlib
+import io
+import os
+import shutil
+import threading
+import time
+from PIL import Image
+from app import posters
+
+# Backup posters keep their guid named paths, which are hard links into a
+# store of blobs named by content hash, so identical posters share one file.
+backup_dir = '/config/backup/'
+blob_dir = '/config/backup/blobs/'
+skip_dirs = ('blobs', 'thumbs')
+# Blobs this new are never pruned, a run may be about to link them
+blob_grace = 3600
+
+def temp_path(path):
+    return path+'.'+str(os.getpid())+'.'+str(threading.get_ident())+'.tmp'
+
+def copy_backup(src, dst):
+    """Copy a file over a backup path without writing through to a shared blob"""
+    tmp = temp_path(dst)
+    if posters.held(src):
+        with open(tmp, 'wb') as f:
+            f.write(posters.load(src))
+    else:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    return dst
+
+# With backup_format 'webp' the guid named paths keep their .png names but
+# link to WebP data. Everything that reads them sniffs the content rather than
+# trusting the extension: PIL, OpenCV, Plex when a backup is uploaded, and
+# browsers, which only ever get the full size file from /static/backup/ as an
+# <img> source and render it whatever Content-Type nginx sends. The poster
+# tables use the thumbnails instead.
+def encode_blob(path, fmt):
+    """Bytes and extension a backup poster is stored with, WebP re-encodes losslessly"""
+    if fmt == 'webp':
+        with Image.open(path) as image:
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+            out = io.BytesIO()
+            image.save(out, 'WEBP', lossless=True, quality=100, method=4)
+            return out.getvalue(), '.webp'
+    with open(path, 'rb') as f:
+        return f.read(), os.path.splitext(path)[1].lower() or '.png'
+
+def store_blob(path, fmt='png'):
+    """Replace a backup file with a hard link to its blob, returning the blob path or None if it's already stored"""
+    if os.stat(path).st_nlink > 1:
+        return None
+    data, ext = encode_blob(path, fmt)
+    digest = hashlib.sha256(data).hexdigest()
+    blob = blob_dir+digest[:2]+'/'+digest+ext
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    for attempt in range(2):
+        if not os.path.exists(blob):
+            tmp = temp_path(blob)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, blob)
+        tmp = temp_path(path)
+        try:
+            os.link(blob, tmp)
+        except FileNotFoundError:
+            # Pruned between the check and the link, write it again
+            continue
+        os.replace(tmp, path)
+        return blob
+    raise FileNotFoundError(blob)
+
+def backup_files():
+    """Every guid named backup file, skipping the blob and thumbnail folders"""
+    for root, dirs, files in os.walk(backup_dir):
+        if root == backup_dir:
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+        for name in files:
+            if not name.endswith('.tmp'):
+                yield os.path.join(root, name)
+
+def prune_blobs():
+    """Delete blobs no backup path links to any more, returning how many went"""
+    removed = 0
+    now = time.time()
+    for root, dirs, files in os.walk(blob_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+                if st.st_nlink == 1 and now - st.st_mtime > blob_grace:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
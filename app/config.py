@@ -10,6 +10,7 @@ import datetime
 
 import os
 from app import scripts 
+from app import module
 import asyncio
 date = datetime.datetime.now()
 date = date.strftime("%y.%m.%d-%H%M")
@@ -47,6 +48,7 @@ def config():
         plex.tautulli_api = request.form['tautulli_api']
         if form.validate_on_submit():
             db.session.commit()
+            module.invalidate_config()
             message = f"The data for {plex.plexurl} has been updated."
             update_scheduler(app)
             return render_template('result.html', message=message, pagetitle='Config Updated', version=version)
@@ -84,6 +86,10 @@ def config_options():
         form.tr_r_p_collection.default = plex.tr_r_p_collection
         form.audio_posters.default = plex.audio_posters
         form.spoilers.default = plex.spoilers
+        form.workers.default = str(plex.workers or 1)
+        form.probe_concurrency.default = str(plex.probe_concurrency or 2)
+        form.fast_probe.default = plex.fast_probe
+        form.backup_format.default = plex.backup_format or 'png'
         form.process()
         return render_template('config_options.html', plex=plex, form=form, pagetitle='Config Options', version=version)
     if request.method=='POST':
@@ -109,8 +115,13 @@ def config_options():
         plex.audio_posters = request.form['audio_posters']
         plex.skip_media_info = request.form['skip_media_info']
         plex.spoilers = request.form['spoilers']
+        plex.workers = request.form['workers']
+        plex.probe_concurrency = request.form['probe_concurrency']
+        plex.fast_probe = request.form['fast_probe']
+        plex.backup_format = request.form['backup_format']
         if form.validate_on_submit():
             db.session.commit()
+            module.invalidate_config()
             message = f"The data for {plex.plexurl} has been updated."
             update_scheduler(app)
             return render_template('result.html', message=message, pagetitle='Config Options Updated', version=version)
@@ -153,6 +164,10 @@ def admin_config_form():
         form.tr_r_p_collection.default = plex.tr_r_p_collection
         form.audio_posters.default = plex.audio_posters
         form.spoilers.default = plex.spoilers
+        form.workers.default = str(plex.workers or 1)
+        form.probe_concurrency.default = str(plex.probe_concurrency or 2)
+        form.fast_probe.default = plex.fast_probe
+        form.backup_format.default = plex.backup_format or 'png'
         form.process()
         return render_template('admin_config.html', plex=plex, form=form, pagetitle='Config Options', version=version)
     if request.method=='POST':
@@ -197,8 +212,13 @@ def admin_config_form():
         plex.mountedpath = request.form['mountedpath']
         plex.skip_media_info = request.form['skip_media_info']
         plex.spoilers = request.form['spoilers']
+        plex.workers = request.form['workers']
+        plex.probe_concurrency = request.form['probe_concurrency']
+        plex.fast_probe = request.form['fast_probe']
+        plex.backup_format = request.form['backup_format']
         if form.validate_on_submit():
             db.session.commit()
+            module.invalidate_config()
             message = f"The data for {plex.plexurl} has been updated."
             scripts.logger_start()
             update_scheduler(app)
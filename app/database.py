@@ -0,0 +1,166 @@
+import sqlite3
+
+db_name = '/config/app.db'
+
+# Applied to every connection, from SQLAlchemy's pool and the raw sqlite3 paths alike
+pragmas = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA busy_timeout=30000',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+)
+
+def sqlite_connect(path=db_name):
+    """Open a sqlite connection with WAL journaling and a busy timeout"""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+# Media tables, shared by setup, the delete_* endpoints and the column type migration
+table_schemas = {
+    'films': """CREATE TABLE "films" (
+            "ID"	INTEGER NOT NULL UNIQUE,
+            "Title"	TEXT NOT NULL,
+            "GUID"	TEXT NOT NULL UNIQUE,
+            "GUIDS"	TEXT NOT NULL,
+            "size"	INTEGER,
+            "res"	TEXT,
+            "hdr"	TEXT,
+            "audio"	TEXT,
+            "poster"	TEXT NOT NULL,
+            "checked"	INTEGER NOT NULL DEFAULT 0,
+            "bannered_poster" TEXT,
+            "url" TEXT,
+            "poster_hash" TEXT,
+            "bannered_poster_hash" TEXT,
+            "thumb" TEXT,
+            "updated_at" INTEGER,
+            PRIMARY KEY("ID" AUTOINCREMENT)
+        ); """,
+    'episodes': """CREATE TABLE "episodes" (
+            "ID"	INTEGER NOT NULL UNIQUE,
+            "show_season" TEXT,
+            "Title"	TEXT NOT NULL,
+            "GUID"	TEXT NOT NULL UNIQUE,
+            "GUIDS"	TEXT NOT NULL,
+            "size"	INTEGER,
+            "res"	TEXT,
+            "hdr"	TEXT,
+            "audio"	TEXT,
+            "poster"	TEXT NOT NULL,
+            "bannered_poster" TEXT,
+            "checked"	INTEGER NOT NULL DEFAULT 0,
+            "blurred"	INTEGER NOT NULL DEFAULT 0,
+            "poster_hash" TEXT,
+            "bannered_poster_hash" TEXT,
+            "thumb" TEXT,
+            "updated_at" INTEGER,
+            PRIMARY KEY("ID" AUTOINCREMENT)
+        ); """,
+    'seasons': """CREATE TABLE "seasons" (
+            "ID"	INTEGER NOT NULL UNIQUE,
+            "Title"	TEXT NOT NULL,
+            "GUID"	TEXT NOT NULL UNIQUE,
+            "poster" TEXT,
+            "bannered_poster" TEXT,
+            "checked" INTEGER NOT NULL DEFAULT 0,
+            "poster_hash" TEXT,
+            "bannered_poster_hash" TEXT,
+            PRIMARY KEY("ID" AUTOINCREMENT)
+        ); """,
+    'library_catalog': """CREATE TABLE "library_catalog" (
+            "ID"	INTEGER NOT NULL UNIQUE,
+            "rating_key"	TEXT NOT NULL UNIQUE,
+            "section"	TEXT NOT NULL,
+            "libtype"	TEXT NOT NULL,
+            "Title"	TEXT NOT NULL,
+            "GUID"	TEXT,
+            "parent_title" TEXT,
+            "grandparent_title" TEXT,
+            "parent_guid" TEXT,
+            "thumb" TEXT,
+            "parent_thumb" TEXT,
+            "updated_at" INTEGER,
+            "seen_at" INTEGER,
+            PRIMARY KEY("ID" AUTOINCREMENT)
+        ); """,
+    'catalog_state': """CREATE TABLE "catalog_state" (
+            "section"	TEXT NOT NULL,
+            "libtype"	TEXT NOT NULL,
+            "refreshed_at" INTEGER,
+            "full_refresh_at" INTEGER,
+            "updated_at" INTEGER,
+            "lease_until" INTEGER,
+            PRIMARY KEY("section", "libtype")
+        ); """,
+}
+
+# How existing values are converted when a table is rebuilt with typed columns
+typed_columns = {
+    'size': "CAST(NULLIF(\"size\", '') AS INTEGER)",
+    'checked': 'COALESCE(CAST("checked" AS INTEGER), 0)',
+    'blurred': 'COALESCE(CAST("blurred" AS INTEGER), 0)',
+}
+
+# Columns covered by the FTS5 index that backs each DataTables search box
+search_columns = {
+    'films': ('Title', 'res', 'hdr', 'audio'),
+    'episodes': ('Title', 'show_season', 'res', 'hdr', 'audio'),
+    'seasons': ('Title',),
+    'library_catalog': ('Title',),
+}
+search_index_tables = set()
+
+def create_search_index(conn, table):
+    """Create the FTS5 index and sync triggers for a table and rebuild it from the table's rows"""
+    columns = search_columns[table]
+    fts = table+'_fts'
+    cols = ', '.join('"'+col+'"' for col in columns)
+    new_cols = ', '.join('new."'+col+'"' for col in columns)
+    old_cols = ', '.join('old."'+col+'"' for col in columns)
+    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS "'+fts+'" USING fts5('+cols+', content="'+table+'", content_rowid="ID", tokenize="trigram")')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS "'+fts+'_ai" AFTER INSERT ON "'+table+'" BEGIN '
+        'INSERT INTO "'+fts+'" (rowid, '+cols+') VALUES (new."ID", '+new_cols+'); END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS "'+fts+'_ad" AFTER DELETE ON "'+table+'" BEGIN '
+        'INSERT INTO "'+fts+'" ("'+fts+'", rowid, '+cols+') VALUES (\'delete\', old."ID", '+old_cols+'); END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS "'+fts+'_au" AFTER UPDATE ON "'+table+'" BEGIN '
+        'INSERT INTO "'+fts+'" ("'+fts+'", rowid, '+cols+') VALUES (\'delete\', old."ID", '+old_cols+'); '
+        'INSERT INTO "'+fts+'" (rowid, '+cols+') VALUES (new."ID", '+new_cols+'); END')
+    conn.execute('INSERT INTO "'+fts+'" ("'+fts+'") VALUES (\'rebuild\')')
+    conn.commit()
+
+def drop_search_index(conn, table):
+    """Drop a table's FTS5 index and its triggers"""
+    fts = table+'_fts'
+    for suffix in ('_ai', '_ad', '_au'):
+        conn.execute('DROP TRIGGER IF EXISTS "'+fts+suffix+'"')
+    conn.execute('DROP TABLE IF EXISTS "'+fts+'"')
+    conn.commit()
+
+def search_index_current(conn, table):
+    """Whether a table has an FTS5 index built with the trigram tokenizer"""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table+'_fts',)).fetchone()
+    return bool(row) and 'trigram' in row[0]
+
+def search_index_ready(table):
+    """Check once per process whether the FTS5 index for a table exists"""
+    if table not in search_index_tables:
+        conn = sqlite_connect()
+        try:
+            row = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table+'_fts',)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return False
+        search_index_tables.add(table)
+    return True
+
+# The trigram index matches any substring of three or more characters, so
+# shorter words get an empty query back and the caller searches with LIKE
+def fts_match(search):
+    """Turn search box text into an FTS5 query matching every word anywhere in a row"""
+    words = search.split()
+    if not words or any(len(w) < 3 for w in words):
+        return ''
+    return ' '.join('"'+w.replace('"', '""')+'"' for w in words)
@@ -45,6 +45,10 @@ class AddRecord_config_options(FlaskForm):
     tr_r_p_collection = SelectField('Enable Automatic "Top Rated", "Popular" and "Recommended" collections', [InputRequired()], choices=[('0', 'False'), ('1', 'True')])
     default_poster = SelectField('Enable default collection posters', [InputRequired()],   choices=[('0', 'False'), ('1', 'True')])
     spoilers = SelectField('Enable the blur unwatched TV episodes script', [InputRequired()],   choices=[('0', 'False'), ('1', 'True')])
+    workers = SelectField('Number of films to process at the same time', [InputRequired()],   choices=[('1', '1'), ('2', '2'), ('4', '4'), ('6', '6'), ('8', '8')])
+    probe_concurrency = SelectField('Number of media files to scan at the same time on each drive', [InputRequired()],   choices=[('1', '1'), ('2', '2'), ('4', '4'), ('8', '8')])
+    fast_probe = SelectField('Only read file headers when scanning media info', [InputRequired()],   choices=[('0', 'False'), ('1', 'True')])
+    backup_format = SelectField('Format to keep backup posters in', [InputRequired()],   choices=[('png', 'PNG'), ('webp', 'WebP lossless')])
     submit = SubmitField('Save Changes ')
 
 class admin_config(FlaskForm):
@@ -89,4 +93,8 @@ class admin_config(FlaskForm):
     tr_r_p_collection = SelectField('Enable Automatic "Top Rated", "Popular" and "Recommended" collections', [InputRequired()], choices=[('0', 'False'), ('1', 'True')])
     default_poster = SelectField('Enable default collection posters', [InputRequired()],   choices=[('0', 'False'), ('1', 'True')])
     spoilers = SelectField('Enable the blur unwatched TV episodes script', [InputRequired()],   choices=[('0', 'False'), ('1', 'True')])
+    workers = SelectField('Number of films to process at the same time', [InputRequired()],   choices=[('1', '1'), ('2', '2'), ('4', '4'), ('6', '6'), ('8', '8')])
+    probe_concurrency = SelectField('Number of media files to scan at the same time on each drive', [InputRequired()],   choices=[('1', '1'), ('2', '2'), ('4', '4'), ('8', '8')])
+    fast_probe = SelectField('Only read file headers when scanning media info', [InputRequired()],   choices=[('0', 'False'), ('1', 'True')])
+    backup_format = SelectField('Format to keep backup posters in', [InputRequired()],   choices=[('png', 'PNG'), ('webp', 'WebP lossless')])
     submit = SubmitField('Save Changes ')    
@@ -1,4 +1,5 @@
 from app import db
+from app.thumbs import thumb_url
 
 
 class Plex(db.Model):
@@ -49,8 +50,12 @@ class Plex(db.Model):
     skip_media_info = db.Column(db.Integer)
     spoilers = db.Column(db.Integer)
     migrated = db.Column(db.Integer)
+    workers = db.Column(db.Integer)
+    probe_concurrency = db.Column(db.Integer)
+    fast_probe = db.Column(db.Integer)
+    backup_format = db.Column(db.String)
     
-    def __init__(self, plexurl, token, filmslibrary, library3d, plexpath, mountedpath, t1, t2, t4, t5, backup, posters4k, mini4k, hdr, posters3d, mini3d, disney, pixar, hide4k, transcode, tvlibrary, tv4kposters, films4kposters, tmdb_api, tmdb_restore, recreate_hdr, new_hdr, default_poster, autocollections, tautulli_server, tautulli_api, mcu_collection, tr_r_p_collection, audio_posters, loglevel, manualplexpath, manualplexpathfield, skip_media_info, spoilers, migrated):
+    def __init__(self, plexurl, token, filmslibrary, library3d, plexpath, mountedpath, t1, t2, t4, t5, backup, posters4k, mini4k, hdr, posters3d, mini3d, disney, pixar, hide4k, transcode, tvlibrary, tv4kposters, films4kposters, tmdb_api, tmdb_restore, recreate_hdr, new_hdr, default_poster, autocollections, tautulli_server, tautulli_api, mcu_collection, tr_r_p_collection, audio_posters, loglevel, manualplexpath, manualplexpathfield, skip_media_info, spoilers, migrated, workers=1, probe_concurrency=2, fast_probe=1, backup_format='png'):
         self.plexurl = plexurl
         self.token = token
         self.filmslibrary = filmslibrary
@@ -92,166 +97,99 @@ class Plex(db.Model):
         self.skip_media_info = skip_media_info
         self.spoilers = spoilers
         self.migrated = migrated
+        self.workers = workers
+        self.probe_concurrency = probe_concurrency
+        self.fast_probe = fast_probe
+        self.backup_format = backup_format
 
 class film_table(db.Model):
     __tablename__ = 'films'
     __bind_key__ = 'db1'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String)
-    guid = db.Column(db.String)
+    guid = db.Column(db.String, index=True, unique=True)
     guids = db.Column(db.String)
-    size = db.Column(db.String)
+    size = db.Column(db.BigInteger)
     res = db.Column(db.String)
     hdr = db.Column(db.String)
     audio = db.Column(db.String)
     poster = db.Column(db.String)
-    checked = db.Column(db.Integer)
+    checked = db.Column(db.Integer, nullable=False, default=0)
     bannered_poster = db.Column(db.String)
     url= db.Column(db.String)
+    poster_hash = db.Column(db.String)
+    bannered_poster_hash = db.Column(db.String)
+    thumb = db.Column(db.String)
+    updated_at = db.Column(db.Integer)
     
 
 
 
     def to_dict(self):
-        rerun = '/rerun-posters4k/'+self.guid
-        rerun_btn =  """<a href="""+rerun+""" class="btn btn-secondary btn-icon-split" id="rerun">
-            <span class="icon text-white-50">
-              <i class="fas fa-undo-alt"></i>
-          </span>
-        </a>
-        """
-        #<span class="text">"""+self.title+"""</span>
-        #restore = '/restore/film/'+self.guid
-        #restore_btn =  """<a href="""+restore+""" class="btn btn-secondary btn-icon-split" id="rerun">
-        #    <span class="icon text-white-50">
-        #      <i class="fas fa-undo-alt"></i>
-        #  </span>
-
-        #</a>
-        #"""
-        delete = '/delete_row/film/'+self.guid
-        delete_btn = """<a href="""+delete+""" class="btn btn-danger btn-icon-split" id="rerun">
-            <span class="icon text-white-50">
-              <i class="fas fa-exclamation-triangle"></i>
-          </span>
-        </a>
-        """
-        try:
-            url_link = """<a href="""+self.url+""">"""+self.title+"""</a>"""
-        except:
-            url_link = self.title
-        #title = 
-        if self.bannered_poster == None:
-            return {
-            'title': rerun_btn,
+        return {
+            'guid': self.guid,
+            'title': self.title,
+            'url': self.url,
             'res': self.res,
             'hdr': self.hdr,
             'audio': self.audio,
-            'poster': "<a href='restore/film/"+self.guid+"'><img height=100px src='"+self.poster+"'></a>",
+            'poster': thumb_url(self.poster, self.poster_hash),
+            'bannered_poster': thumb_url(self.bannered_poster, self.bannered_poster_hash),
             'checked': self.checked,
-            'bannered_poster': "<a href='restore/bannered_film/"+self.guid+"'><img height=100px src=''></a>" ,               
-            'delete': delete_btn,
-            'url': url_link
-            }
-        elif self.bannered_poster != None:
-            return {
-                'title': rerun_btn,
-                'res': self.res,
-                'hdr': self.hdr,
-                'audio': self.audio,
-                'poster': "<a href='restore/film/"+self.guid+"'><img    height=100px src='"+self.poster+"'></a>",
-                'checked': self.checked,
-                'bannered_poster': "<a href='restore/bannered_film/"+self.guid  +"'><img height=100px src='"+self.bannered_poster+"'></a>", 
-                'delete': delete_btn,
-                'url': url_link              
-            }
+        }
 
 class ep_table(db.Model):
     __tablename__ = 'episodes'
     __bind_key__ = 'db1'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String, index=True)
-    guid = db.Column(db.String, index=True)
+    guid = db.Column(db.String, index=True, unique=True)
     guids = db.Column(db.String, index=True)
-    size = db.Column(db.String)
+    size = db.Column(db.BigInteger)
     res = db.Column(db.String)
     hdr = db.Column(db.String)
     audio = db.Column(db.String)
     poster = db.Column(db.String)
     bannered_poster = db.Column(db.String)
-    checked = db.Column(db.Integer)
-    blurred = db.Column(db.Integer)
+    checked = db.Column(db.Integer, nullable=False, default=0)
+    blurred = db.Column(db.Integer, nullable=False, default=0)
     show_season = db.Column(db.String, index=True)
+    poster_hash = db.Column(db.String)
+    bannered_poster_hash = db.Column(db.String)
+    thumb = db.Column(db.String)
+    updated_at = db.Column(db.Integer)
 
     def to_dict(self):
-        poster = "<a href='restore/episode/"+self.guid+"'><img height=100px src='"+self.poster+"'></a>"
-        rerun = '/rerun-tv-posters/'+self.guid
-        restore_btn =  """<a href="""+rerun+""" class="btn btn-secondary btn-icon-split" id="rerun">
-            <span class="icon text-white-50">
-              <i class="fas fa-undo-alt"></i>
-          </span>
-            <span class="text">"""+self.title+"""</span>
-        </a>
-        """
-        delete = '/delete_row/episode/'+self.guid
-        delete_btn = """<a href="""+delete+""" class="btn btn-danger btn-icon-split" id="rerun">
-            <span class="icon text-white-50">
-              <i class="fas fa-exclamation-triangle"></i>
-          </span>
-        </a>
-        """
-        if self.bannered_poster == None:
-            return {
-                'show_season': self.show_season,
-                'title': restore_btn,
-                'res': self.res,
-                'hdr': self.hdr,
-                'audio': self.audio,
-                'poster': poster,
-                'bannered_poster': "<a href='restore/bannered_poster/"+self.guid+"'><img height=100px src=''></a>",
-                'checked': self.checked,
-                'blurred': self.blurred,
-                'delete': delete_btn
-            }
-        else:
-            bannered_poster = "<a href='restore/bannered_episode/"+self.guid+"'><img height=100px src='"+self.bannered_poster+"'></a>"
-            return {
-                'show_season': self.show_season,
-                'title': restore_btn,
-                'res': self.res,
-                'hdr': self.hdr,
-                'audio': self.audio,
-                'poster': poster,
-                'bannered_poster': bannered_poster,
-                'checked': self.checked,
-                'blurred': self.blurred,
-                'delete': delete_btn
-            }            
+        return {
+            'guid': self.guid,
+            'show_season': self.show_season,
+            'title': self.title,
+            'res': self.res,
+            'hdr': self.hdr,
+            'audio': self.audio,
+            'poster': thumb_url(self.poster, self.poster_hash),
+            'bannered_poster': thumb_url(self.bannered_poster, self.bannered_poster_hash),
+            'checked': self.checked,
+            'blurred': self.blurred,
+        }
 
 class season_table(db.Model):
     __tablename__ = 'seasons'
     __bind_key__ = 'db1'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String, index=True)
-    guid = db.Column(db.String, index=True)
+    guid = db.Column(db.String, index=True, unique=True)
     poster = db.Column(db.String)
     bannered_poster = db.Column(db.String)
-    checked = db.Column(db.Integer)
+    checked = db.Column(db.Integer, nullable=False, default=0)
+    poster_hash = db.Column(db.String)
+    bannered_poster_hash = db.Column(db.String)
 
     def to_dict(self):
-        delete = '/delete_row/season/'+self.guid
-        delete_btn = """<a href="""+delete+""" class="btn btn-danger btn-icon-split" id="rerun">
-            <span class="icon text-white-50">
-              <i class="fas fa-exclamation-triangle"></i>
-          </span>
-        </a>
-        """
-        bannered_poster = "<a href='restore/bannered_season/"+self.guid+"'><img height=100px src='"+self.bannered_poster+"'></a>"
-        poster = "<a href='restore/season/"+self.guid+"'><img height=100px src='"+self.poster+"'></a>"
         return {
+            'guid': self.guid,
             'title': self.title,
-            'poster': poster,
-            'bannered_poster': bannered_poster,
+            'poster': thumb_url(self.poster, self.poster_hash),
+            'bannered_poster': thumb_url(self.bannered_poster, self.bannered_poster_hash),
             'checked': self.checked,
-            'delete': delete_btn
-        }        
\ No newline at end of file
+        }
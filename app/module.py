@@ -11,7 +11,25 @@ import json
 from pathlib import PureWindowsPath, PurePosixPath
 import cv2
 import time
+import threading
+from types import SimpleNamespace
+import hashlib
+import sqlite3
+import multiprocessing
+import numpy as np
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.models import Plex
+from app.database import sqlite_connect, fts_match
+from app.thumbs import write_thumbnail, thumb_dir
+from app.blobs import copy_backup, store_blob, temp_path
+from app import posters
+from app import transfers
+from app import blobs
+from datetime import datetime
 
 
 # REMOVED: These module-level database queries cause Flask application context errors
@@ -42,21 +60,225 @@ mini_box = (0,0,350,275)
 hdr_box = (0,1342,493,1608)
 a_box = (0,1608,493,1766)
 cutoff = 7
+# final_poster_compare: the bottom right quarter, which no banner covers
+compare_box = (1000,1500,2000,3000)
+
+# Banner reference hashes, computed once per process and persisted next to the config
+reference_hashes = None
+reference_hashes_lock = threading.Lock()
+reference_hash_file = '/config/reference_hashes.json'
+reference_images = {
+    'film': {
+        'banner': 'app/img/chk-4k.png',
+        'mini_banner': 'app/img/chk-mini-4k2.png',
+        'hdr': 'app/img/chk_hdr.png',
+        'dolby_vision': 'app/img/chk_dolby_vision.png',
+        'hdr10': 'app/img/chk_hdr10.png',
+        'new_hdr': 'app/img/chk_hdr_new.png',
+        'atmos': 'app/img/chk_atmos.png',
+        'dtsx': 'app/img/chk_dtsx.png',
+    },
+    'tv': {
+        'banner': 'app/img/tv/chk_4k.png',
+        'hdr': 'app/img/tv/chk_hdr.png',
+        'dolby_vision': 'app/img/tv/chk_dv.png',
+        'hdr10': 'app/img/tv/chk_hdr10.png',
+        'atmos': 'app/img/tv/chk_atmos.png',
+        'dtsx': 'app/img/tv/chk_dts.png',
+    },
+    '3d': {
+        'banner': 'app/img/chk_3d_wide.png',
+        'mini_banner': 'app/img/chk-3D-mini.png',
+    },
+}
+
+# Config snapshot, reloaded when another worker saves the config
+config_snapshot = None
+config_version = None
+config_lock = threading.Lock()
+config_stamp_file = '/config/config.version'
+
+# Shared Plex connection, rebuilt when the url or token changes
+plex_server = None
+plex_server_key = None
+plex_server_lock = threading.Lock()
+
+# First video stream details by ratingKey, fetched in bulk before a run
+stream_info = {}
+stream_info_lock = threading.Lock()
+prefetch_page_size = 100
+
+# Row writes keyed by (table, guid), committed together in batches
+pending_writes = {}
+pending_writes_lock = threading.Lock()
+write_flush_lock = threading.Lock()
+write_batch_depth = 0
+write_batch_size = 200
+write_batch_seconds = 5
+last_write_flush = 0
+
+# Row counts for the DataTables endpoints, kept until the database's
+# data_version moves, which happens whenever any other connection commits,
+# in this process or another worker
+row_counts = {}
+row_counts_lock = threading.Lock()
+row_count_conn = None
+
+# Local mirror of the Plex libraries that backs /search. Sections older than
+# catalog_ttl seconds are refreshed from updatedAt; a full resync every
+# catalog_full_ttl seconds drops items removed from Plex. A worker refreshing a
+# section holds a lease on its catalog_state row for up to catalog_lease
+# seconds so the other workers leave it alone.
+catalog_ttl = 900
+catalog_full_ttl = 86400
+catalog_lease = 1800
+catalog_fields = {
+    'movie': (),
+    'show': (),
+    'season': ('parentTitle', 'parentGuid', 'parentThumb'),
+    'episode': ('parentTitle', 'grandparentTitle', 'parentGuid', 'parentThumb'),
+}
+
+# MediaInfo results keyed by path, kept apart from app.db so a restored or
+# rebuilt database doesn't re-probe the whole library
+media_probe_db = '/config/media_probe.db'
+media_probe_ready = False
+
+# Threads for MediaInfo probes, limited per mounted device by probe_concurrency
+probe_pool = None
+probe_pool_size = 8
+probe_pool_lock = threading.Lock()
+probe_futures = {}
+mount_slots = {}
+mount_slots_limit = None
+fast_parse_speed = 0
+
+# Worker processes for decoding, resizing, hashing and encoding posters. Only
+# runs that work on several films at once start them, a lone thread would just
+# wait on each job. They are started with forkserver, forking a process that
+# already runs threads can leave a child holding a copy of a lock nobody will
+# release.
+image_pool = None
+image_pool_users = 0
+image_pool_lock = threading.Lock()
+image_pool_limit = max(1, (os.cpu_count() or 2)//2)
+
+# Limit how many posters are uploaded to Plex at the same time
+upload_slots = threading.BoundedSemaphore(2)
+
+# Posters downloaded ahead of a run, per run so one run finishing can't cancel another's
+poster_prefetch_window = 16
+
+# Pre-merged overlay layers keyed by banner combination
+tv_overlays = None
+overlay_layers = {}
+overlay_layers_lock = threading.Lock()
+max_overlay_layers = 16
+
+def get_config_version():
+    try:
+        return os.stat(config_stamp_file).st_mtime_ns
+    except OSError:
+        return 0
 
 def get_config():
-    """Get Plex configuration from database - must be called within Flask app context"""
-    return Plex.query.filter(Plex.id == '1').first()
+    """Get a snapshot of the Plex configuration - must be called within Flask app context"""
+    global config_snapshot, config_version
+    version = get_config_version()
+    with config_lock:
+        if config_snapshot is None or version != config_version:
+            row = Plex.query.filter(Plex.id == '1').first()
+            if row is None:
+                return None
+            config_snapshot = SimpleNamespace(**{column.name: getattr(row, column.name) for column in Plex.__table__.columns})
+            config_version = version
+        return config_snapshot
 
-def get_plex_server():
-    """Get PlexServer instance - must be called within Flask app context"""
-    config = get_config()
-    return PlexServer(config.plexurl, config.token)
+def invalidate_config():
+    """Drop the config snapshot and Plex connection in every worker after the config is saved"""
+    global config_snapshot
+    with config_lock:
+        config_snapshot = None
+    reset_plex_server()
+    try:
+        stamp = time.time_ns()
+        with open(config_stamp_file, 'a'):
+            os.utime(config_stamp_file, ns=(stamp, stamp))
+    except OSError as e:
+        get_logger().warning('Cannot update config version: '+repr(e))
+
+def get_plex_server(config=None):
+    """Get the shared PlexServer instance - must be called within Flask app context"""
+    global plex_server, plex_server_key
+    if config is None:
+        config = get_config()
+    key = (config.plexurl, config.token)
+    with plex_server_lock:
+        if plex_server is None or plex_server_key != key:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            plex_server = PlexServer(config.plexurl, config.token, session=session)
+            plex_server_key = key
+        return plex_server
+
+def plex_item_url(i):
+    """Plex web link for an item, using the shared server's machine identifier"""
+    return "https://app.plex.tv/desktop#!/server/"+str(get_plex_server().machineIdentifier)+'/details?key=%2Flibrary%2Fmetadata%2F'+str(i.ratingKey)
+
+def reset_plex_server():
+    """Drop the shared PlexServer so the next call connects with the saved config"""
+    global plex_server, plex_server_key
+    with plex_server_lock:
+        plex_server = None
+        plex_server_key = None
 
 def get_logger():
     """Get logger to avoid circular import issues"""
     from app.scripts import logger
     return logger
 
+def get_reference_hashes():
+    """Get the banner reference hashes, loading them on first use"""
+    global reference_hashes
+    if reference_hashes is None:
+        with reference_hashes_lock:
+            if reference_hashes is None:
+                reference_hashes = load_reference_hashes()
+    return reference_hashes
+
+def load_reference_hashes():
+    """Hash the banner check images, reusing stored hashes for unchanged files"""
+    logger = get_logger()
+    try:
+        with open(reference_hash_file) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        stored = {}
+    hashes = {}
+    changed = False
+    for group, images in reference_images.items():
+        hashes[group] = {}
+        for name, path in images.items():
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            entry = stored.get(path)
+            if entry and entry.get('sha1') == digest:
+                hashes[group][name] = imagehash.hex_to_hash(entry['hash'])
+            else:
+                chk_hash = imagehash.average_hash(Image.open(path))
+                stored[path] = {'sha1': digest, 'hash': str(chk_hash)}
+                hashes[group][name] = chk_hash
+                changed = True
+    if changed:
+        try:
+            with open(reference_hash_file, 'w') as f:
+                json.dump(stored, f)
+        except OSError as e:
+            logger.warning('Cannot save reference hashes: '+repr(e))
+    return hashes
+
 def load_image_assets():
     """Load image assets when needed"""
     global banner_4k, mini_4k_banner, banner_dv, banner_hdr10, banner_new_hdr, atmos, dtsx
@@ -90,6 +312,138 @@ def load_image_assets():
         dtsx = cv2.imread("app/img/dtsx.png", cv2.IMREAD_UNCHANGED)
         dtsx = Image.fromarray(dtsx)
 
+def load_tv_image_assets():
+    """Load TV banner images when needed"""
+    global tv_overlays
+    if tv_overlays is None:
+        tv_overlays = {
+            'tv_4k': Image.open("app/img/tv/4k.png").convert('RGBA'),
+            'tv_background': Image.open("app/img/tv/Background.png").convert('RGBA'),
+            'tv_dolby_vision': Image.open("app/img/tv/dolby_vision.png").convert('RGBA'),
+            'tv_hdr10': Image.open("app/img/tv/hdr10.png").convert('RGBA'),
+            'tv_hdr': Image.open("app/img/tv/hdr.png").convert('RGBA'),
+            'tv_atmos': Image.open("app/img/tv/atmos.png").convert('RGBA'),
+            'tv_dtsx': Image.open("app/img/tv/dtsx.png").convert('RGBA'),
+        }
+
+def get_overlay(name):
+    """Get a single banner image by name"""
+    if name.startswith('tv_'):
+        load_tv_image_assets()
+        return tv_overlays[name]
+    load_image_assets()
+    film_overlays = {
+        '4k': banner_4k,
+        'mini_4k': mini_4k_banner,
+        'dolby_vision': banner_dv,
+        'hdr10': banner_hdr10,
+        'hdr': banner_new_hdr,
+        'atmos': atmos,
+        'dtsx': dtsx,
+    }
+    return film_overlays[name]
+
+def get_overlay_layer(names):
+    """Get the named banners merged into one layer, cropped to its visible area"""
+    key = tuple(names)
+    with overlay_layers_lock:
+        if key in overlay_layers:
+            return overlay_layers[key]
+    overlays = [get_overlay(name).convert('RGBA') for name in key]
+    width = max(o.size[0] for o in overlays)
+    height = max(o.size[1] for o in overlays)
+    layer = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    for o in overlays:
+        layer.alpha_composite(o)
+    bbox = layer.getchannel('A').getbbox() or (0, 0, 1, 1)
+    entry = (layer.crop(bbox), bbox[:2])
+    with overlay_layers_lock:
+        if len(overlay_layers) >= max_overlay_layers:
+            overlay_layers.pop(next(iter(overlay_layers)))
+        overlay_layers[key] = entry
+    return entry
+
+@contextmanager
+def image_workers(workers):
+    """Run pixel jobs in worker processes while this many items are processed at the same time"""
+    global image_pool, image_pool_users
+    with image_pool_lock:
+        image_pool_users += 1
+        if image_pool is None:
+            try:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                # Each worker is one core, keep OpenCV from starting its own thread pool
+                image_pool = ProcessPoolExecutor(max_workers=min(workers, image_pool_limit), mp_context=context, initializer=cv2.setNumThreads, initargs=(1,))
+            except (ValueError, OSError) as e:
+                get_logger().warning('Image workers unavailable, processing images inline: '+repr(e))
+                image_pool = False
+    try:
+        yield
+    finally:
+        with image_pool_lock:
+            image_pool_users -= 1
+            pool = None
+            if image_pool_users == 0:
+                pool, image_pool = image_pool, None
+        if pool:
+            pool.shutdown()
+
+def run_image_job(job, *args):
+    """Run a pixel job in the image worker pool, or in this thread when no pool is running"""
+    global image_pool
+    pool = image_pool
+    if pool:
+        try:
+            return pool.submit(job, *args).result()
+        except BrokenProcessPool as e:
+            get_logger().warning('Image worker pool stopped, processing images inline: '+repr(e))
+            with image_pool_lock:
+                if image_pool is pool:
+                    image_pool = False
+    return job(*args)
+
+def read_file(path):
+    return posters.load(path)
+
+def region_hashes_job(image, size, boxes):
+    """Average hashes of the detection boxes of a poster"""
+    regions = open_poster_regions(image, size, boxes)
+    return [str(imagehash.average_hash(region)) for region in regions]
+
+def compose_job(image, overlays, size):
+    """Paste the merged overlay layer onto a resized copy of a poster"""
+    layer, offset = get_overlay_layer(overlays)
+    background = image.resize(size, Image.LANCZOS)
+    background.paste(layer, offset, layer)
+    return background
+
+def region_hash(image, size, box):
+    """Average hash of one box, in poster size coordinates, cropped without resizing the whole poster"""
+    width, height = image.size
+    return imagehash.average_hash(image.crop((box[0]*width/size[0], box[1]*height/size[1], box[2]*width/size[0], box[3]*height/size[1])))
+
+# The Plex copy is normally the image already decoded for banner detection. When
+# only its bytes are at hand it's decoded straight to quarter size greyscale,
+# which is all an 8x8 average hash needs.
+def compare_job(new_image, plex_poster):
+    """Check that the untouched region of the composited poster hashes the same as Plex's copy"""
+    size = (2000,3000)
+    if isinstance(plex_poster, bytes):
+        plex_poster = cv2.imdecode(np.frombuffer(plex_poster, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if plex_poster is None:
+            return False
+        plex_poster = Image.fromarray(plex_poster)
+    return region_hash(new_image, size, compare_box) == region_hash(plex_poster, size, compare_box)
+
+def blur_job(image):
+    return image.filter(ImageFilter.GaussianBlur(30))
+
+def get_region_hashes(tmp_poster, size, boxes):
+    """Hash the detection boxes of a poster in the image worker pool"""
+    hashes = run_image_job(region_hashes_job, posters.image(tmp_poster), size, boxes)
+    return [imagehash.hex_to_hash(h) for h in hashes]
+
 def get_tmdb_guid(g):
     g = g[1:-1]
     g = re.sub(r'[*?:"<>| ]',"",g)
@@ -132,13 +486,18 @@ def tmdb_poster_path(b_dir, i, g, episode, season):
 
 def get_tmdb_poster(fname, poster):
     logger = get_logger()
-    req = requests.get(poster_url_base+poster, stream=True)
     logger.debug("tmdb: "+poster_url_base+poster)
     logger.debug(fname)
+    try:
+        req = transfers.fetch(poster_url_base+poster)
+    except transfers.TransferError as e:
+        logger.error("Can't get poster from TMDB: "+repr(e))
+        return None
     if req.status_code == 200:
-        with open(fname, 'wb') as f:
-            for chunk in req:
-                f.write(chunk)
+        tmp = temp_path(fname)
+        with open(tmp, 'wb') as f:
+            f.write(req.content)
+        os.replace(tmp, fname)
         return fname
     else:
         logger.error("Can't get poster from TMDB")
@@ -146,45 +505,19 @@ def get_tmdb_poster(fname, poster):
 def check_banners(tmp_poster, size):
     logger = get_logger()
     try:
-        background = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)
-        background = cv2.cvtColor(background, cv2.COLOR_BGR2RGB)
-        background = Image.fromarray(background)
-        background = background.resize(size,Image.LANCZOS)
-
-        # Wide banner box
-        bannerchk = background.crop(bannerbox)
-        # Mini Banner Box
-        minichk = background.crop(mini_box)
-        # Audio Box
-        audiochk = background.crop(a_box)
-        # HDR Box
-        hdrchk = background.crop(hdr_box)
+        # Wide banner, mini banner, audio and HDR boxes
         # POSTER HASHES
-        # Wide Banner
-        poster_banner_hash = imagehash.average_hash(bannerchk)
-        # Mini Banner
-        poster_mini_hash = imagehash.average_hash(minichk)
-        # Audio Banner
-        poster_audio_hash = imagehash.average_hash(audiochk)
-        # HDR Banner
-        poster_hdr_hash = imagehash.average_hash(hdrchk)
+        poster_banner_hash, poster_mini_hash, poster_audio_hash, poster_hdr_hash = get_region_hashes(tmp_poster, size, (bannerbox, mini_box, a_box, hdr_box))
         # General Hashes
-        chk_banner = Image.open("app/img/chk-4k.png")
-        chk_banner_hash = imagehash.average_hash(chk_banner)
-        chk_mini_banner = Image.open("app/img/chk-mini-4k2.png")
-        chk_mini_banner_hash = imagehash.average_hash(chk_mini_banner)
-        chk_hdr = Image.open("app/img/chk_hdr.png")
-        chk_hdr_hash = imagehash.average_hash(chk_hdr)
-        chk_dolby_vision = Image.open("app/img/chk_dolby_vision.png")
-        chk_dolby_vision_hash = imagehash.average_hash(chk_dolby_vision)
-        chk_hdr10 = Image.open("app/img/chk_hdr10.png")
-        chk_hdr10_hash = imagehash.average_hash(chk_hdr10)
-        chk_new_hdr = Image.open("app/img/chk_hdr_new.png")
-        chk_new_hdr_hash = imagehash.average_hash(chk_new_hdr)
-        atmos_box = Image.open("app/img/chk_atmos.png")
-        chk_atmos_hash = imagehash.average_hash(atmos_box)
-        dtsx_box = Image.open("app/img/chk_dtsx.png")
-        chk_dtsx_hash = imagehash.average_hash(dtsx_box)
+        chk = get_reference_hashes()['film']
+        chk_banner_hash = chk['banner']
+        chk_mini_banner_hash = chk['mini_banner']
+        chk_hdr_hash = chk['hdr']
+        chk_dolby_vision_hash = chk['dolby_vision']
+        chk_hdr10_hash = chk['hdr10']
+        chk_new_hdr_hash = chk['new_hdr']
+        chk_atmos_hash = chk['atmos']
+        chk_dtsx_hash = chk['dtsx']
         wide_banner = mini_banner = audio_banner = hdr_banner = old_hdr = False
         if poster_banner_hash - chk_banner_hash <= cutoff:
             wide_banner = True
@@ -208,31 +541,16 @@ def check_banners(tmp_poster, size):
     except OSError as e:
         logger.error('Cannot open image: '+repr(e))
 
-def get_poster(i, tmp_poster, title, b_dir, height, width, r):
+def get_poster(i, tmp_poster, title, b_dir, height, width, r, prefetch=None):
     logger = get_logger()
-    plex = get_plex_server()
     
     logger.debug(i.title+' Getting poster')
-    imgurl = plex.transcodeImage(
-        i.thumbUrl,
-        height=height,
-        width=width,
-        imageFormat='png'
-    )
-    img = requests.get(imgurl, stream=True)
-    filename = tmp_poster
     valid = ''
     try:
+        url = poster_url(i, height, width)
+        img = prefetch.take(url) if prefetch else transfers.fetch(url)
         if img.status_code == 200:
-            img.raw.decode_content = True
-            with open(filename, 'wb') as f:                        
-                for chunk in img:
-                    f.write(chunk)
-            try:
-                img = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)
-                cv2.imwrite(tmp_poster, img)
-            except Exception as e:
-                logger.error(repr(e))
+            posters.keep(tmp_poster, img.content)
         else:
             logger.info("Get Poster: "+title+ ' cannot find the poster for this film')
     except OSError as e:
@@ -248,9 +566,7 @@ def get_poster(i, tmp_poster, title, b_dir, height, width, r):
             poster = re.sub('static', '/config', r[0].poster)
             if poster:
                 if poster:
-                    tmp_poster = '/tmp/'+re.sub('/config/backup/films/', '', poster)
-                    img = cv2.imread(poster, cv2.IMREAD_ANYCOLOR)
-                    cv2.imwrite(tmp_poster, img)                    
+                    tmp_poster = posters.keep('/tmp/'+os.path.basename(poster), read_file(poster))
                     return tmp_poster, valid
         except:
             logger.warning("poster is blank, getting poster from TMDB")
@@ -272,6 +588,60 @@ def get_poster(i, tmp_poster, title, b_dir, height, width, r):
                 tmp_poster = get_tmdb_poster(tmp_poster, poster)
             return tmp_poster, valid
     
+def poster_url(i, height, width):
+    return get_plex_server().transcodeImage(i.thumbUrl, height=height, width=width, imageFormat='png')
+
+def changed_posters(items, rows, table):
+    """Items of a run whose poster will be downloaded, leaving out the ones poster_unchanged skips"""
+    changed = []
+    for i in items:
+        r = lookup_rows(rows, table, str(i.guid))
+        if not (r and r[0].size == i.media[0].parts[0].size and poster_unchanged(i, r)):
+            changed.append(i)
+    return changed
+
+class PosterPrefetch:
+    """Posters of the next items of one run, downloaded ahead on the transfer engine"""
+
+    def __init__(self, urls, window=poster_prefetch_window):
+        self.queue = iter(urls)
+        self.window = window
+        self.futures = {}
+        self.lock = threading.Lock()
+        with self.lock:
+            self.fill()
+
+    def fill(self):
+        while self.queue is not None and len(self.futures) < self.window:
+            url = next(self.queue, None)
+            if url is None:
+                self.queue = None
+                break
+            self.futures[url] = transfers.submit('GET', url)
+
+    def take(self, url):
+        """Response for a poster download, using the prefetched one if it was started"""
+        with self.lock:
+            future = self.futures.pop(url, None)
+            self.fill()
+        if future is not None:
+            try:
+                return future.result()
+            except CancelledError:
+                pass
+        return transfers.fetch(url)
+
+    def close(self):
+        with self.lock:
+            self.queue = None
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+
+def prefetch_posters(items, height, width):
+    """Start downloading the posters of a run's items, keeping poster_prefetch_window of them in flight"""
+    return PosterPrefetch([poster_url(i, height, width) for i in items])
+
 def get_season_poster(ep, tmp_poster, config):
     logger = get_logger()
     plex = get_plex_server()
@@ -287,15 +657,10 @@ def get_season_poster(ep, tmp_poster, config):
         width=width,
         imageFormat='png'
     )
-    img = requests.get(imgurl, stream=True)
-    filename = tmp_poster
     try:
+        img = transfers.fetch(imgurl)
         if img.status_code == 200:
-            img.raw.decode_content = True
-            with open(filename, 'wb') as f:                        
-                for chunk in img:
-                    f.write(chunk)
-            return tmp_poster 
+            return posters.keep(tmp_poster, img.content)
         else:
             logger.info("Get Poster: "+title+ ' - cannot find the poster for this film')
     except OSError as e:
@@ -303,37 +668,71 @@ def get_season_poster(ep, tmp_poster, config):
     except Exception as e:
         logger.error('Get Poster Exception: '+repr(e))    
 
+def store_stream_info(m):
+    try:
+        stream = m.media[0].parts[0].streams[0]
+        info = {
+            'dovi': stream.DOVIPresent == True,
+            'dovi_profile': stream.DOVIProfile,
+            'display_title': stream.displayTitle or '',
+        }
+    except IndexError:
+        info = None
+    with stream_info_lock:
+        stream_info[str(m.ratingKey)] = info
+
+def prefetch_stream_info(plex, items):
+    """Fetch the first video stream of many items in paged bulk requests"""
+    logger = get_logger()
+    keys = [str(i.ratingKey) for i in items]
+    for n in range(0, len(keys), prefetch_page_size):
+        page = keys[n:n+prefetch_page_size]
+        try:
+            for m in plex.fetchItems('/library/metadata/'+','.join(page)):
+                store_stream_info(m)
+        except Exception as e:
+            logger.warning('Stream prefetch failed: '+repr(e))
+
+def clear_stream_info():
+    with stream_info_lock:
+        stream_info.clear()
+
+def get_stream_info(i, plex):
+    """Get the first video stream details of an item, fetching it if it wasn't prefetched"""
+    key = str(i.ratingKey)
+    if key not in stream_info:
+        for m in plex.fetchItems(i.key):
+            store_stream_info(m)
+    return stream_info.get(key)
+
 def get_plex_hdr(i, plex):
     logger = get_logger()
-    ekey = i.key
-    m = plex.fetchItems(ekey)
-    for m in m:
+    info = get_stream_info(i, plex)
+    if info is None:
+        return None
+    if info['dovi']:
+        hdr_version='Dolby Vision'
         try:
-            if m.media[0].parts[0].streams[0].DOVIPresent == True:
-                hdr_version='Dolby Vision'
-                try:
-                    i.addLabel('Dolby Vision', locked=False)
-                except:
-                    pass
-                if m.media[0].parts[0].streams[0].DOVIProfile == 5:
-                    logger.error(i.title+" is version 5")
-            elif 'HDR' in m.media[0].parts[0].streams[0].displayTitle:
-                hdr_version='HDR'
-                try:
-                    i.addLabel('HDR', locked=False)
-                except:
-                    pass
-            else:
-                hdr_version = 'none'
-            return hdr_version
-        except IndexError:
+            i.addLabel('Dolby Vision', locked=False)
+        except:
             pass
+        if info['dovi_profile'] == 5:
+            logger.error(i.title+" is version 5")
+    elif 'HDR' in info['display_title']:
+        hdr_version='HDR'
+        try:
+            i.addLabel('HDR', locked=False)
+        except:
+            pass
+    else:
+        hdr_version = 'none'
+    return hdr_version
 
 def validate_image(tmp_poster):
     logger = get_logger()
     try:
-        img = Image.open(tmp_poster)
-        img.verify()
+        # Decoding it is the check, the image is kept for the stages that follow
+        posters.image(tmp_poster)
         logger.debug("Image is valid")
         valid = True
         return valid
@@ -343,6 +742,36 @@ def validate_image(tmp_poster):
         valid = False
         return valid
 
+def poster_unchanged(i, r):
+    """Check if Plex still has the poster that was last processed for this item"""
+    if not r or r[0].checked != 1 or not getattr(r[0], 'thumb', None):
+        return False
+    updated_at = int(i.updatedAt.timestamp()) if i.updatedAt else None
+    return r[0].thumb == i.thumb and r[0].updated_at == updated_at
+
+def record_poster_state(i, r, table, db):
+    """Remember the thumb and updatedAt Plex reports for an item's current poster"""
+    logger = get_logger()
+    try:
+        row = r[0].id
+        media = table.query.get(row)
+        if hasattr(media, 'thumb'):
+            media.thumb = i.thumb
+            media.updated_at = int(i.updatedAt.timestamp()) if i.updatedAt else None
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.debug('Recording poster state: '+repr(e))
+
+def forget_poster_state(table, guid, db):
+    """Clear the recorded thumb so the next run processes the poster again"""
+    try:
+        for media in table.query.filter(table.guid == guid).all():
+            media.thumb = None
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
 def upload_poster(tmp_poster, title, db, r, table, i, banner_file):
     logger = get_logger()
     logger.debug("UPLOAD POSTER")
@@ -350,20 +779,23 @@ def upload_poster(tmp_poster, title, db, r, table, i, banner_file):
     logger.debug(banner_file)
     try:
         valid = changed = ''
-        if os.path.exists(tmp_poster) == True:
+        if posters.exists(tmp_poster) == True:
             try:
                 valid = validate_image(tmp_poster)
                 changed = bannered_poster_compare(banner_file, r, i)
                 logger.debug('poster valid / changed: '+str(valid)+' - '+str(changed))
                 if (valid == True and changed == 'True'):
                     logger.debug('uploading poster')
-                    i.uploadPoster(filepath=tmp_poster)
+                    with upload_slots:
+                        send_poster(i, read_file(tmp_poster))
                     #time.sleep(2)
                     try:
                         row = r[0].id
                         media = table.query.get(row)
-                        media.checked = '1'
+                        media.checked = 1
                         db.session.commit()     
+                        i.reload()
+                        record_poster_state(i, r, table, db)
                     except IndexError as e:
                         logger.debug('Updating database to checked: '+repr(e))              
                 elif valid == (False or ''):
@@ -376,7 +808,7 @@ def upload_poster(tmp_poster, title, db, r, table, i, banner_file):
             logger.error('Poster for '+title+" isn't here")
             row = r[0].id
             media = table.query.get(row)
-            media.checked = '0'
+            media.checked = 0
             try:
                 db.session.commit()
             except:
@@ -389,57 +821,182 @@ def upload_poster(tmp_poster, title, db, r, table, i, banner_file):
             db.session.rollback()
         logger.error("Can't upload the poster: "+repr(e))         
 
-def scan_files(config, i, plex):
+def media_probe_connect():
+    global media_probe_ready
+    conn = sqlite_connect(media_probe_db)
+    if not media_probe_ready:
+        conn.execute("""CREATE TABLE IF NOT EXISTS "media_probe" (
+                "path" TEXT NOT NULL PRIMARY KEY,
+                "size" INTEGER NOT NULL,
+                "mtime" INTEGER NOT NULL,
+                "hdr_format" TEXT,
+                "hdr_commercial" TEXT,
+                "audio" TEXT,
+                "full" INTEGER
+            )""")
+        try:
+            conn.execute('ALTER TABLE media_probe ADD COLUMN "full" INTEGER')
+        except sqlite3.OperationalError:
+            pass
+        conn.commit()
+        media_probe_ready = True
+    return conn
+
+def get_cached_probe(path, size, mtime):
+    conn = media_probe_connect()
+    try:
+        row = conn.execute(
+            'SELECT hdr_format, hdr_commercial, audio, full FROM media_probe WHERE path = ? AND size = ? AND mtime = ?',
+            (path, size, mtime)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row:
+        probe = {'hdr_format': row[0], 'hdr_commercial': row[1], 'audio': row[2]}
+        # Rows cached before probes recorded a full parse are checked again
+        if row[3] or not probe_inconclusive(probe):
+            return probe
+
+def store_probe(path, size, mtime, probe, full):
+    conn = media_probe_connect()
+    try:
+        conn.execute(
+            'INSERT OR REPLACE INTO media_probe (path, size, mtime, hdr_format, hdr_commercial, audio, full) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (path, size, mtime, probe['hdr_format'], probe['hdr_commercial'], probe['audio'], int(full))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def parse_media_info(x):
+    """Pull the HDR format and audio codec out of MediaInfo JSON"""
+    tracks = x['media']['track']
+    hdr_format = None
+    hdr_commercial = None
+    has_video = False
+    try:
+        video = tracks[1]
+        has_video = 'Video' in video.get('@type', '')
+        hdr_format = video.get('HDR_Format_String')
+        for key in ('HDR_Format_Commercial', 'HDR_Format_Commercial_IfAny', 'HDR_Format_Compatibillity'):
+            if key in video:
+                hdr_commercial = video[key]
+                break
+    except IndexError:
+        pass
+    audio = 'unknown'
+    for track in tracks[:10]:
+        if 'Audio' not in track.get('@type', ''):
+            continue
+        if 'Format_Commercial_IfAny' in track:
+            audio = track['Format_Commercial_IfAny']
+            if 'XLL X' in track.get('Format_AdditionalFeatures', ''):
+                audio = 'DTS:X'
+            break
+        elif 'Format' in track:
+            audio = track['Format']
+            break
+    return {'hdr_format': hdr_format, 'hdr_commercial': hdr_commercial, 'audio': audio, 'video': has_video}
+
+def get_mount_slot(st, limit):
+    global mount_slots, mount_slots_limit
+    with probe_pool_lock:
+        if limit != mount_slots_limit:
+            mount_slots = {}
+            mount_slots_limit = limit
+        if st.st_dev not in mount_slots:
+            mount_slots[st.st_dev] = threading.BoundedSemaphore(limit)
+        return mount_slots[st.st_dev]
+
+def probe_inconclusive(probe):
+    """Whether a header only probe stopped before it reached the video or audio track"""
+    return (probe['audio'] or 'unknown') == 'unknown' or probe.get('video') is False
+
+def probe_file(file, limit=2, fast=True):
+    """MediaInfo details of a file, parsed once per (path, size, mtime)"""
+    file = str(file)
+    st = os.stat(file)
+    probe = get_cached_probe(file, st.st_size, st.st_mtime_ns)
+    if probe is None:
+        with get_mount_slot(st, limit):
+            full = not fast
+            if fast:
+                x = json.loads(MediaInfo.parse(file, output='JSON', parse_speed=fast_parse_speed))
+                probe = parse_media_info(x)
+                if probe_inconclusive(probe):
+                    # The default parse speed, a full read would cost more than the probe saves
+                    x = json.loads(MediaInfo.parse(file, output='JSON'))
+                    probe = parse_media_info(x)
+                    full = True
+            else:
+                x = json.loads(MediaInfo.parse(file, output='JSON'))
+                probe = parse_media_info(x)
+        store_probe(file, st.st_size, st.st_mtime_ns, probe, full)
+    return probe
+
+def get_probe_pool():
+    global probe_pool
+    with probe_pool_lock:
+        if probe_pool is None:
+            probe_pool = ThreadPoolExecutor(max_workers=probe_pool_size, thread_name_prefix='probe')
+        return probe_pool
+
+def schedule_probes(config, items):
+    """Start MediaInfo probes for items in the background so scan_files can pick up the results"""
     logger = get_logger()
-    logger.debug('Scanning '+i.title)
+    limit = int(config.probe_concurrency or 2)
+    fast = config.fast_probe != 0
+    pool = get_probe_pool()
+    for i in items:
+        try:
+            file = str(media_file(config, i))
+        except (IndexError, AttributeError) as e:
+            logger.debug('Cannot schedule probe: '+repr(e))
+            continue
+        with probe_pool_lock:
+            if file not in probe_futures:
+                probe_futures[file] = pool.submit(probe_file, file, limit, fast)
+
+def clear_probes():
+    with probe_pool_lock:
+        for future in probe_futures.values():
+            future.cancel()
+        probe_futures.clear()
+
+def get_probe(config, file):
+    file = str(file)
+    with probe_pool_lock:
+        future = probe_futures.pop(file, None)
+    if future is not None and not future.cancelled():
+        return future.result()
+    return probe_file(file, int(config.probe_concurrency or 2), config.fast_probe != 0)
+
+def media_file(config, i):
     p = PureWindowsPath(i.media[0].parts[0].file)
     p1 = re.findall('[A-Z]', p.parts[0])
     if p1 != []:
-        logger.debug('path is: '+str(p1))
-        file = PurePosixPath('/films', *p.parts[1:])
+        return PurePosixPath('/films', *p.parts[1:])
     elif config.manualplexpath == 1:
-        file = re.sub(config.manualplexpathfield, '/films', i.media[0].parts[0].file)
+        return re.sub(config.manualplexpathfield, '/films', i.media[0].parts[0].file)
     else:
-        file = re.sub(config.plexpath, '/films', i.media[0].parts[0].file)
+        return re.sub(config.plexpath, '/films', i.media[0].parts[0].file)
+
+def scan_files(config, i, plex):
+    logger = get_logger()
+    logger.debug('Scanning '+i.title)
+    file = media_file(config, i)
     logger.debug(file)
     try:
-        m = MediaInfo.parse(file, output='JSON')
-        x = json.loads(m)
+        probe = get_probe(config, file)
         hdr_version = get_plex_hdr(i, plex)
-        if hdr_version != 'none':
-            try:
-                hdr_version = x['media']['track'][1]['HDR_Format_String']
-            except (KeyError, IndexError):
-                if "dolby" not in str.lower(hdr_version):
-                    try:
-                        hdr_version = x['media']['track'][1]['HDR_Format_Commercial']
-                    except (KeyError, IndexError):
-                        try:
-                            hdr_version = x['media']['track'][1]['HDR_Format_Commercial_IfAny']
-                        except (KeyError, IndexError):
-                            try:
-                                hdr_version = x['media']['track'][1]['HDR_Format_Compatibillity']
-                            except:
-                                pass
+        if hdr_version and hdr_version != 'none':
+            if probe['hdr_format']:
+                hdr_version = probe['hdr_format']
+            elif probe['hdr_commercial'] and "dolby" not in str.lower(hdr_version):
+                hdr_version = probe['hdr_commercial']
         elif not hdr_version:
             hdr_version = 'none'
-        audio = "unknown"
-        try:
-            while True:
-                for f in range(10):
-                    if 'Audio' in x['media']['track'][f]['@type']:
-                        if 'Format_Commercial_IfAny' in x['media']['track'][f]:
-                            audio = x['media']['track'][f]['Format_Commercial_IfAny']
-                            if 'XLL X' in x['media']['track'][f]["Format_AdditionalFeatures"]:
-                                audio = 'DTS:X'
-                            break
-                        elif 'Format' in x['media']['track'][f]:
-                            audio = x['media']['track'][f]['Format']
-                            break
-                if audio != "":
-                    break
-        except (IndexError, KeyError) as e:
-            logger.debug(i.title+' '+repr(e))
+        audio = probe['audio']
     except Exception as e:
         logger.warning('No access to files: '+repr(e))
         audio = 'None'
@@ -472,7 +1029,7 @@ def backup_poster(tmp_poster, banners, config, r, i, b_dir, g, episode, season,
             if 'static' in b_file:
                 b_file = re.sub('static', '/config', b_file)
             logger.debug(b_file)
-            shutil.copy(newdir+'poster_bak.png', b_file)
+            copy_backup(newdir+'poster_bak.png', b_file)
             return b_file
     except:
         pass
@@ -491,7 +1048,7 @@ def backup_poster(tmp_poster, banners, config, r, i, b_dir, g, episode, season,
         except:
             print("this didn't work")
         try:
-            shutil.copy(tmp_poster, b_file)
+            copy_backup(tmp_poster, b_file)
         except:
             pass
         return b_file
@@ -539,14 +1096,299 @@ def backup_poster(tmp_poster, banners, config, r, i, b_dir, g, episode, season,
             else:
                 logger.warning("Creating backup file from TMDb didn't work")
 
+def preload_rows(table, db):
+    """Load a table keyed by guid for one run, detached so worker threads can read the rows"""
+    rows = {}
+    for row in table.query.all():
+        rows.setdefault(row.guid, []).append(row)
+    db.session.expunge_all()
+    return rows
+
+def lookup_rows(rows, table, guid):
+    if rows is None:
+        return table.query.filter(table.guid == guid).all()
+    return rows.get(guid, [])
+
+def data_version():
+    global row_count_conn
+    if row_count_conn is None:
+        row_count_conn = sqlite_connect()
+    return row_count_conn.execute('PRAGMA data_version').fetchone()[0]
+
+def get_row_count(table):
+    """Row count of a table, cached until something commits to the database"""
+    with row_counts_lock:
+        version = data_version()
+        cached = row_counts.get(table.__tablename__)
+        if cached and cached[1] == version:
+            return cached[0]
+    count = table.query.count()
+    with row_counts_lock:
+        row_counts[table.__tablename__] = (count, version)
+    return count
+
+def forget_row_counts():
+    with row_counts_lock:
+        row_counts.clear()
+
+def stored_posters(table, guids):
+    """{guid: poster} for the given guids in one query"""
+    if not guids:
+        return {}
+    rows = table.query.with_entities(table.guid, table.poster).filter(table.guid.in_(set(guids))).all()
+    return {guid: poster for guid, poster in rows}
+
+def catalog_sections(config):
+    """(section, libtype) pairs mirrored for the configured film and tv libraries"""
+    sections = [(lib, 'movie') for lib in config.filmslibrary.split(',') if lib]
+    for lib in config.tvlibrary.split(','):
+        if lib:
+            sections += [(lib, 'show'), (lib, 'season'), (lib, 'episode')]
+    return sections
+
+def catalog_stamps():
+    conn = sqlite_connect()
+    try:
+        return {(row[0], row[1]): row[2] for row in conn.execute('SELECT section, libtype, refreshed_at FROM catalog_state')}
+    finally:
+        conn.close()
+
+def catalog_fresh(config):
+    """Whether every configured library was mirrored within catalog_ttl"""
+    stamps = catalog_stamps()
+    now = time.time()
+    return all(now - (stamps.get(s) or 0) < catalog_ttl for s in catalog_sections(config))
+
+def catalog_populated(config):
+    """Whether every configured library has been mirrored at least once"""
+    stamps = catalog_stamps()
+    return all(stamps.get(s) for s in catalog_sections(config))
+
+def catalog_row(i, section, libtype, seen_at):
+    values = {'parentTitle': None, 'grandparentTitle': None, 'parentGuid': None, 'parentThumb': None}
+    for field in catalog_fields[libtype]:
+        values[field] = getattr(i, field)
+    updated_at = int(i.updatedAt.timestamp()) if i.updatedAt else None
+    return (str(i.ratingKey), section, libtype, i.title, i.guid, values['parentTitle'], values['grandparentTitle'],
+        values['parentGuid'], i.thumb, values['parentThumb'], updated_at, seen_at)
+
+def claim_catalog_section(conn, section, libtype, now):
+    """Take the refresh lease on a section, False if another worker holds it"""
+    conn.execute('INSERT OR IGNORE INTO catalog_state (section, libtype) VALUES (?, ?)', (section, libtype))
+    claimed = conn.execute(
+        'UPDATE catalog_state SET lease_until = ? WHERE section = ? AND libtype = ? AND (lease_until IS NULL OR lease_until < ?)',
+        (now + catalog_lease, section, libtype, now)).rowcount
+    conn.commit()
+    return claimed == 1
+
+def refresh_catalog_section(conn, plex, section, libtype):
+    now = int(time.time())
+    state = conn.execute('SELECT refreshed_at, full_refresh_at, updated_at FROM catalog_state WHERE section = ? AND libtype = ?', (section, libtype)).fetchone()
+    if state and now - (state[0] or 0) < catalog_ttl:
+        return
+    if not claim_catalog_section(conn, section, libtype, now):
+        return
+    try:
+        mirror_catalog_section(conn, plex, section, libtype, now)
+    finally:
+        conn.rollback()
+        conn.execute('UPDATE catalog_state SET lease_until = NULL WHERE section = ? AND libtype = ?', (section, libtype))
+        conn.commit()
+
+def mirror_catalog_section(conn, plex, section, libtype, now):
+    # Read the state again now the lease is held, another worker may have just finished
+    state = conn.execute('SELECT refreshed_at, full_refresh_at, updated_at FROM catalog_state WHERE section = ? AND libtype = ?', (section, libtype)).fetchone()
+    if now - (state[0] or 0) < catalog_ttl:
+        return
+    full = not state[2] or now - (state[1] or 0) >= catalog_full_ttl
+    lib = plex.library.section(section)
+    items = None
+    if not full:
+        try:
+            items = lib.search(libtype=libtype, filters={'updatedAt>>': datetime.fromtimestamp(state[2])})
+        except Exception as e:
+            get_logger().debug('Library catalog: incremental refresh of '+section+' failed, resyncing: '+repr(e))
+            full = True
+    if full:
+        items = lib.search(libtype=libtype)
+    rows = [catalog_row(i, section, libtype, now) for i in items]
+    conn.executemany(
+        'INSERT INTO library_catalog (rating_key, section, libtype, "Title", "GUID", parent_title, grandparent_title, '
+        'parent_guid, thumb, parent_thumb, updated_at, seen_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT(rating_key) DO UPDATE SET section = excluded.section, libtype = excluded.libtype, "Title" = excluded."Title", '
+        '"GUID" = excluded."GUID", parent_title = excluded.parent_title, grandparent_title = excluded.grandparent_title, '
+        'parent_guid = excluded.parent_guid, thumb = excluded.thumb, parent_thumb = excluded.parent_thumb, '
+        'updated_at = excluded.updated_at, seen_at = excluded.seen_at', rows)
+    if full:
+        conn.execute('DELETE FROM library_catalog WHERE section = ? AND libtype = ? AND seen_at < ?', (section, libtype, now))
+    updated_at = max([row[10] for row in rows if row[10]] + [state[2] or 0])
+    conn.execute(
+        'INSERT INTO catalog_state (section, libtype, refreshed_at, full_refresh_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+        'ON CONFLICT(section, libtype) DO UPDATE SET refreshed_at = excluded.refreshed_at, '
+        'full_refresh_at = COALESCE(excluded.full_refresh_at, full_refresh_at), updated_at = excluded.updated_at',
+        (section, libtype, now, now if full else None, updated_at or None))
+    conn.commit()
+
+def refresh_catalog(config):
+    """Mirror new and updated Plex items of the configured libraries into library_catalog"""
+    conn = None
+    try:
+        plex = get_plex_server(config)
+        conn = sqlite_connect()
+        for section, libtype in catalog_sections(config):
+            refresh_catalog_section(conn, plex, section, libtype)
+    except Exception as e:
+        get_logger().error('Library catalog refresh: '+repr(e))
+    finally:
+        if conn:
+            conn.close()
+
+def search_catalog(config, text):
+    """Catalog rows with a title matching the search text, joined to the stored poster for each guid"""
+    match = fts_match(text)
+    if match:
+        where, arg = 'c."ID" IN (SELECT rowid FROM library_catalog_fts WHERE library_catalog_fts MATCH ?)', match
+    else:
+        where, arg = 'c."Title" LIKE ?', '%'+text.strip()+'%'
+    sections = catalog_sections(config)
+    conn = sqlite_connect()
+    try:
+        rows = conn.execute(
+            'SELECT c.section, c.libtype, c."Title", c."GUID", c.parent_title, c.grandparent_title, c.parent_guid, c.thumb, '
+            'c.parent_thumb, COALESCE(f.poster, e.poster, s.poster, \'\') FROM library_catalog c '
+            'LEFT JOIN films f ON c.libtype = \'movie\' AND f."GUID" = c."GUID" '
+            'LEFT JOIN episodes e ON c.libtype = \'episode\' AND e."GUID" = c."GUID" '
+            'LEFT JOIN seasons s ON c.libtype = \'season\' AND s."GUID" = c."GUID" '
+            'WHERE '+where+' ORDER BY c."ID"', (arg,)).fetchall()
+    finally:
+        conn.close()
+    return [row for row in rows if (row[0], row[1]) in sections]
+
+def changed_guids(table, sizes):
+    """Guids from a {guid: size} Plex snapshot that are missing from the table or whose size differs"""
+    conn = sqlite_connect()
+    try:
+        conn.execute('CREATE TEMP TABLE snapshot ("guid" TEXT PRIMARY KEY, "size" INTEGER)')
+        conn.executemany('INSERT OR REPLACE INTO snapshot VALUES (?, ?)', sizes.items())
+        rows = conn.execute(
+            'SELECT s.guid FROM snapshot s LEFT JOIN "'+table.__tablename__+'" t ON t.guid = s.guid '
+            'WHERE t.guid IS NULL OR t.size IS NOT s.size'
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row[0] for row in rows}
+
+def queue_write(db, table, guid, insert=False, **values):
+    """Queue a write to the row with this guid; insert=True adds the row if it doesn't exist"""
+    values = {k: v for k, v in values.items() if k in table.__table__.c}
+    with pending_writes_lock:
+        key = (table.__tablename__, guid)
+        if key in pending_writes:
+            pending = pending_writes[key]
+            pending['insert'] = pending['insert'] or insert
+            pending['values'].update(values)
+        else:
+            pending_writes[key] = {'table': table, 'insert': insert, 'values': values}
+        due = (
+            write_batch_depth == 0
+            or len(pending_writes) >= write_batch_size
+            or time.monotonic() - last_write_flush >= write_batch_seconds
+        )
+    if due:
+        flush_writes(db)
+
+def write_pending(db, table, guid):
+    with pending_writes_lock:
+        return (table.__tablename__, guid) in pending_writes
+
+def execute_writes(db, table, insert, columns, rows):
+    t = table.__table__
+    if insert:
+        stmt = sqlite_insert(t)
+        if columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[t.c.guid],
+                set_={c: stmt.excluded[c] for c in columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[t.c.guid])
+        db.session.execute(stmt, rows)
+    elif columns:
+        stmt = t.update().where(t.c.guid == bindparam('b_guid')).values({c: bindparam('b_'+c) for c in columns})
+        db.session.execute(stmt, [{'b_'+k: v for k, v in row.items()} for row in rows])
+
+def flush_writes(db):
+    """Commit every queued write in a single transaction, falling back to one row at a time if it fails"""
+    global last_write_flush
+    logger = get_logger()
+    with write_flush_lock:
+        with pending_writes_lock:
+            writes = list(pending_writes.items())
+            pending_writes.clear()
+            last_write_flush = time.monotonic()
+        if not writes:
+            return
+        groups = {}
+        for (name, guid), pending in writes:
+            table = pending['table']
+            columns = tuple(sorted(pending['values']))
+            groups.setdefault((table, pending['insert'], columns), []).append(dict(pending['values'], guid=guid))
+        try:
+            for (table, insert, columns), rows in groups.items():
+                execute_writes(db, table, insert, columns, rows)
+            db.session.commit()
+            logger.debug('Wrote '+str(len(writes))+' rows')
+        except Exception as e:
+            db.session.rollback()
+            logger.warning('Batched database write failed, writing rows one at a time: '+repr(e))
+            for (table, insert, columns), rows in groups.items():
+                for row in rows:
+                    try:
+                        execute_writes(db, table, insert, columns, [row])
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.error('Database write for '+str(row['guid'])+' in '+table.__tablename__+' failed: '+repr(e))
+        forget_row_counts()
+
+def flush_timer(app, db, stop):
+    """Flush queued writes every write_batch_seconds, even while no new writes arrive"""
+    while not stop.wait(write_batch_seconds):
+        try:
+            with app.app_context():
+                flush_writes(db)
+        except Exception as e:
+            get_logger().error('Timed database flush failed: '+repr(e))
+
+@contextmanager
+def batched_writes(db):
+    """Queue row writes for the duration of a script and flush them on a timer and on exit or error"""
+    global write_batch_depth
+    from flask import current_app
+    stop = threading.Event()
+    with pending_writes_lock:
+        write_batch_depth += 1
+    timer = threading.Thread(target=flush_timer, args=[current_app._get_current_object(), db, stop], name='write_flush', daemon=True)
+    timer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        with pending_writes_lock:
+            write_batch_depth -= 1
+        flush_writes(db)
+
+def find_rows(db, table, guid):
+    """Query rows by guid, flushing queued writes for the guid first"""
+    if write_pending(db, table, guid):
+        flush_writes(db)
+    return table.query.filter(table.guid == guid).all()
+
 def insert_intoTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season):
     logger = get_logger()
-    plex = get_plex_server()
-    
     logger.debug(table)
     logger.debug(tmp_poster)
-    url = "https://app.plex.tv/desktop#!/server/"+str(plex.machineIdentifier)+'/details?key=%2Flibrary%2Fmetadata%2F'+str(i.ratingKey)
-    db.session.close()
+    url = plex_item_url(i)
     p = PureWindowsPath(i.media[0].parts[0].file)
     p1 = re.findall('[A-Z]', p.parts[0])    
     if p1 != []:
@@ -569,26 +1411,16 @@ def insert_intoTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, ti
         pass
     logger.debug('Adding '+i.title+' to database')
     logger.debug(b_file)
+    poster_hash = backup_hash(b_file)
     if ('film_table' in str(table) or 'season_table' in str(table)):
-        film = table(title=title, guid=guid, guids=guids, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, checked='0', url=url)
+        queue_write(db, table, guid, insert=True, title=title, guids=guids, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, poster_hash=poster_hash, checked=0, url=url)
     elif 'ep_table' in str(table):
         show_season = i.grandparentTitle+': '+i.parentTitle
-        film = table(title=title, guid=guid, guids=guids, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, checked='0', show_season=show_season)
-    try:
-        db.session.add(film)
-        db.session.commit()
-    except:
-        db.session.rollback()
-        raise logger.error(Exception('Database Roll back error'))
-    finally:
-        db.session.close()
+        queue_write(db, table, guid, insert=True, title=title, guids=guids, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, poster_hash=poster_hash, checked=0, show_season=show_season)
 
 def updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season):
     logger = get_logger()
-    plex = get_plex_server()
-    
-    db.session.close()
-    url = "https://app.plex.tv/desktop#!/server/"+str(plex.machineIdentifier)+'/details?key=%2Flibrary%2Fmetadata%2F'+str(i.ratingKey)
+    url = plex_item_url(i)
     logger.debug(title+' final pre-database checks')
     logger.debug(title+' '+hdr+' '+audio)  
     logger.debug(banners) 
@@ -599,58 +1431,24 @@ def updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title,
             b_file = re.sub('/config', 'static', b_file)
     else:
         b_file = r[0].poster
+    poster_hash = backup_hash(b_file)
+    logger.debug('Updating '+title+' in database')
     if ('film_table' in str(table) or 'season_table' in str(table)):
-        try:
-            logger.debug('Updating '+title+' in database')
-            row = r[0].id
-            film = table.query.get(row)
-            film.size = size
-            film.res = res
-            film.hdr = hdr
-            film.audio = audio
-            film.poster = b_file
-            film.checked = '0'
-            film.url = url
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            logger.error(repr(e))
-
-        finally:
-            db.session.close()
+        queue_write(db, table, r[0].guid, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, poster_hash=poster_hash, checked=0, url=url)
     else:
-        try:
-            logger.debug('Updating '+title+' in database')
-            row = r[0].id
-            film = table.query.get(row)
-            film.show_season = i.grandparentTitle+': '+i.parentTitle
-            film.size = size
-            film.res = res
-            film.hdr = hdr
-            film.audio = audio
-            film.poster = b_file
-            film.checked = '0'
-            db.session.commit()
-        except:
-            db.session.rollback()
-            raise logger.error(Exception('Database Roll back error'))
-
-        finally:
-            db.session.close()        
+        show_season = i.grandparentTitle+': '+i.parentTitle
+        queue_write(db, table, r[0].guid, show_season=show_season, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, poster_hash=poster_hash, checked=0)
 
 def blur(tmp_poster, r, table, db, guid):
     poster = re.sub('.png', '.blurred.png', tmp_poster)
-    background = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)
-    background = cv2.cvtColor(background, cv2.COLOR_BGR2RGB)
-    background = Image.fromarray(background)
-    blur = background.filter(ImageFilter.GaussianBlur(30))
-    blur.save(poster)
+    image = run_image_job(blur_job, posters.image(tmp_poster))
+    # Stays in memory alongside a held source, otherwise it's written out for plexapi to upload
+    if posters.held(tmp_poster):
+        posters.keep_image(poster, image)
+    else:
+        posters.set_image(poster, image)
     from app.models import ep_table
-    r = ep_table.query.filter(ep_table.guid == guid).all()
-    row = r[0].id
-    film = table.query.get(row)
-    film.blurred = '1'
-    db.session.commit()
+    queue_write(db, ep_table, guid, blurred=1)
     return poster
 
 def check_tv_banners(i, tmp_poster, img_title):
@@ -661,42 +1459,18 @@ def check_tv_banners(i, tmp_poster, img_title):
     a_box = (32,560,306,685)
     cutoff = 10
     size = (1280,720)
-    background = open_poster(tmp_poster, size)
-
-
-    # 4K banner box
-    bannerchk = background.crop(box_4k)
-    # Audio Box
-    audiochk = background.crop(a_box)
-    # HDR Box
-    hdrchk = background.crop(hdr_box)
-
+    # 4K banner, audio and HDR boxes
     # POSTER HASHES
-    # 4K Banner
-    poster_banner_hash = imagehash.average_hash(bannerchk)
-    # Audio Banner
-    poster_audio_hash = imagehash.average_hash(audiochk)
-    # HDR Banner
-    poster_hdr_hash = imagehash.average_hash(hdrchk)
+    poster_banner_hash, poster_audio_hash, poster_hdr_hash = get_region_hashes(tmp_poster, size, (box_4k, a_box, hdr_box))
 
     # General Hashes
-    chk_4k = Image.open("app/img/tv/chk_4k.png")
-    chk_banner_hash = imagehash.average_hash(chk_4k)
-
-    chk_hdr = Image.open("app/img/tv/chk_hdr.png")
-    chk_hdr_hash = imagehash.average_hash(chk_hdr)
-
-    chk_dolby_vision = Image.open("app/img/tv/chk_dv.png")
-    chk_dolby_vision_hash = imagehash.average_hash(chk_dolby_vision)
-
-    chk_hdr10 = Image.open("app/img/tv/chk_hdr10.png")
-    chk_hdr10_hash = imagehash.average_hash(chk_hdr10)
-
-    atmos_box = Image.open("app/img/tv/chk_atmos.png")
-    chk_atmos_hash = imagehash.average_hash(atmos_box)
-
-    dtsx_box = Image.open("app/img/tv/chk_dts.png")
-    chk_dtsx_hash = imagehash.average_hash(dtsx_box)
+    chk = get_reference_hashes()['tv']
+    chk_banner_hash = chk['banner']
+    chk_hdr_hash = chk['hdr']
+    chk_dolby_vision_hash = chk['dolby_vision']
+    chk_hdr10_hash = chk['hdr10']
+    chk_atmos_hash = chk['atmos']
+    chk_dtsx_hash = chk['dtsx']
 
     banner_4k = audio_banner = hdr_banner = False
 
@@ -719,46 +1493,72 @@ def check_tv_banners(i, tmp_poster, img_title):
 def add_bannered_poster_to_db(tmp_poster, db, title, table, guid, banner_file):
     logger = get_logger()
     logger.debug(banner_file)
-    shutil.copy(tmp_poster, banner_file)
-    try:    
-        logger.debug('Adding bannered poster for: '+title+' in database')
-        r = table.query.filter(table.guid == guid).all()
-        row = r[0].id
-        media = table.query.get(row)       
-        media.bannered_poster = re.sub('/config','static', banner_file)
-        db.session.commit()   
-    finally:
-        db.session.close()
+    copy_backup(tmp_poster, banner_file)
+    logger.debug('Adding bannered poster for: '+title+' in database')
+    queue_write(db, table, guid, bannered_poster=re.sub('/config','static', banner_file), bannered_poster_hash=backup_hash(banner_file))
 
 def add_season_to_db(db, title, table, pguid, banner_file, poster):
     logger = get_logger()
-    try:    
-        logger.debug('Updating '+title+' in database')
-        r = table.query.filter(table.guid == pguid).all()  
-        poster = re.sub('/config', 'static', poster)
-        banner_file = re.sub('/config', 'static', banner_file)
-        if r:
-            logger.debug('r exists')
-            row = r[0].id
-            media = table.query.get(row)      
-            media.bannered_poster = banner_file
-            media.poster = poster
-            media.checked = '0'
-            db.session.commit()          
-        else:
-            logger.debug(title+' '+pguid+' '+poster+' '+banner_file)
-            season = table(title=title, guid=pguid, poster=poster, bannered_poster=banner_file)
-            try:
-                db.session.add(season)
-                db.session.commit()
-            except:
-                db.session.rollback()
-                raise Exception('Database Rollback error')
+    logger.debug('Updating '+title+' in database')
+    poster = re.sub('/config', 'static', poster)
+    banner_file = re.sub('/config', 'static', banner_file)
+    logger.debug(title+' '+pguid+' '+poster+' '+banner_file)
+    try:
+        queue_write(db, table, pguid, insert=True, title=title, poster=poster, bannered_poster=banner_file, poster_hash=backup_hash(poster), bannered_poster_hash=backup_hash(banner_file), checked=0)
+    except Exception as e:
+        logger.error(repr(e))
+
+def hash_image_file(path, thumb=False):
+    """Average hash of an image file, tagged with the file's mtime"""
+    image = cv2.imread(path, cv2.IMREAD_ANYCOLOR)
+    image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if thumb:
+        try:
+            write_thumbnail(image, path)
+        except Exception as e:
+            get_logger().warning('Thumbnail for '+path+' failed: '+repr(e))
+    image_hash = imagehash.average_hash(image)
+    return str(os.stat(path).st_mtime_ns)+':'+str(image_hash)
+
+def backup_hash(b_file):
+    """Hash a backup file for the database and refresh its thumbnail, None if it can't be read"""
+    try:
+        path = re.sub('static', '/config', b_file)
+        store_backup(path)
+        return hash_image_file(path, thumb=True)
+    except Exception:
+        return None
+
+def store_backup(path):
+    """Swap a backup file for a hard link into the blob store, True if it was stored now"""
+    if not path.startswith(blobs.backup_dir) or path.startswith((blobs.blob_dir, thumb_dir)) or not os.path.isfile(path):
+        return False
+    fmt = getattr(config_snapshot, 'backup_format', None) or 'png'
+    try:
+        return store_blob(path, fmt) is not None
     except Exception as e:
+        get_logger().warning('Storing backup '+path+' failed: '+repr(e))
+        return False
+
+def get_file_hash(row, column, path):
+    """Get the stored hash for a row's backup file, rehashing only if the file has changed"""
+    from app import db
+    stored = getattr(row, column, None)
+    row_path = getattr(row, re.sub('_hash$', '', column), None) or ''
+    if re.sub('static', '/config', row_path) != path:
+        return imagehash.hex_to_hash(hash_image_file(path).split(':')[1])
+    if stored and os.path.exists(path):
+        mtime, image_hash = stored.split(':')
+        if mtime == str(os.stat(path).st_mtime_ns):
+            return imagehash.hex_to_hash(image_hash)
+    stored = hash_image_file(path)
+    try:
+        db.session.query(type(row)).filter_by(id=row.id).update({column: stored})
+        db.session.commit()
+        setattr(row, column, stored)
+    except Exception:
         db.session.rollback()
-        logger.error(repr(e))   
-    finally:
-        db.session.close() 
+    return imagehash.hex_to_hash(stored.split(':')[1])
 
 def check_for_new_poster(tmp_poster, r, i, table, db):
     logger = get_logger()
@@ -772,13 +1572,8 @@ def check_for_new_poster(tmp_poster, r, i, table, db):
             poster_file = re.sub('static', '/config', poster_file)
             
             try:
-                bak_poster = cv2.imread(poster_file, cv2.IMREAD_ANYCOLOR)
-                bak_poster = cv2.cvtColor(bak_poster, cv2.COLOR_BGR2RGB)
-                bak_poster = Image.fromarray(bak_poster)
-                bak_poster_hash = imagehash.average_hash(bak_poster)
-                poster = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)
-                poster = cv2.cvtColor(poster, cv2.COLOR_BGR2RGB)
-                poster = Image.fromarray(poster)
+                bak_poster_hash = get_file_hash(r[0], 'bannered_poster_hash', poster_file)
+                poster = posters.image(tmp_poster)
                 poster_hash = imagehash.average_hash(poster)
             except SyntaxError as e:
                     logger.error('Check for new poster Syntax Error: '+repr(e))
@@ -813,7 +1608,7 @@ def check_for_new_poster(tmp_poster, r, i, table, db):
         try:
             row = r[0].id
             media = table.query.get(row)
-            media.checked = '0'
+            media.checked = 0
             db.session.commit()     
         except IndexError as e:
             logger.debug('Updating database for new detected poster: '+repr(e)) 
@@ -840,12 +1635,8 @@ def bannered_poster_compare(bannered_poster, r, i):
                     poster_file = re.sub('static', '/config', poster_file)
                     print('Poster file: '+poster_file)
                     try:
-                        bak_poster = cv2.imread(poster_file, cv2.IMREAD_ANYCOLOR)
-                        bak_poster = Image.fromarray(bak_poster)
-                        bak_poster_hash = imagehash.average_hash(bak_poster)
-                        poster = cv2.imread(clean_poster, cv2.IMREAD_ANYCOLOR)
-                        poster = Image.fromarray(poster)
-                        poster_hash = imagehash.average_hash(poster)
+                        bak_poster_hash = get_file_hash(r[0], 'bannered_poster_hash', poster_file)
+                        poster_hash = get_file_hash(r[0], 'poster_hash', clean_poster)
                     except SyntaxError as e:
                             logger.error('Check for new poster Syntax Error: '+repr(e))
                     except OSError as e:
@@ -884,7 +1675,6 @@ def bannered_poster_compare(bannered_poster, r, i):
 
 def season_decision_tree(config, banners, ep, hdr, res, tmp_poster):
     logger = get_logger()
-    load_image_assets()  # Load images when needed
     
     wide_banner = banners[0]
     mini_banner = banners[1]
@@ -892,114 +1682,102 @@ def season_decision_tree(config, banners, ep, hdr, res, tmp_poster):
 
     logger.debug(banners)
     logger.debug("Decision tree")    
-
+    overlays = []
     if (hdr != 'none' and config.hdr == 1 and hdr_banner == False):
         logger.info(ep.title+" HDR Banner")
-        try:
-            size = (2000,3000)
-            background = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)#Image.open(tmp_poster)
-            background = cv2.cvtColor(background, cv2.COLOR_BGR2RGB)
-            background = Image.fromarray(background)
-            background = background.resize(size,Image.LANCZOS)
-            background.paste(banner_new_hdr, (0, 0), banner_new_hdr)
-            background.save(tmp_poster)
-        except OSError as e:
-            logger.error('HDR Poster error: '+repr(e))
+        overlays.append('hdr')
     else:
         logger.debug("Not adding hdr season banner")
     if (res == '4k' and config.films4kposters == 1 and wide_banner == mini_banner == False):
-        try:
-            size = (2000,3000)
-            background = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)#Image.open(tmp_poster)
-            background = cv2.cvtColor(background, cv2.COLOR_BGR2RGB)
-            background = Image.fromarray(background)
-            background = background.resize(size,Image.LANCZOS)
-            if config.mini4k == 1:
-                logger.info(ep.title+' Adding Mini 4K Banner')
-                background.paste(mini_4k_banner, (0,0), mini_4k_banner)
-                background.save(tmp_poster)
-            else:
-                logger.info(ep.title+' Adding 4k Banner')
-                background.paste(banner_4k, (0, 0), banner_4k)
-                background.save(tmp_poster)
-        except OSError as e:
-            logger.error('4K poster error: '+repr(e))
+        if config.mini4k == 1:
+            logger.info(ep.title+' Adding Mini 4K Banner')
+            overlays.append('mini_4k')
+        else:
+            logger.info(ep.title+' Adding 4k Banner')
+            overlays.append('4k')
     else:
         logger.debug("Not adding 4k season banner")            
+    compose_banners(tmp_poster, overlays, (2000,3000))
+
+def send_poster(i, data):
+    """Upload poster bytes to a Plex item through the transfer engine"""
+    url = i._server.url('/library/metadata/'+str(i.ratingKey)+'/posters', includeToken=True)
+    transfers.post(url, content=data).raise_for_status()
+
+def copy_poster(tmp_poster, copy):
+    """Copy a working poster, in memory if the source is held there"""
+    if posters.held(tmp_poster):
+        return posters.copy(tmp_poster, copy)
+    return shutil.copy(tmp_poster, copy)
 
 def remove_tmp_files(tmp_poster):
-    try:
-        os.remove(tmp_poster)
-    except FileNotFoundError:
-        pass  
+    posters.discard(tmp_poster)
+
+def release_tmp_files(*paths):
+    """Drop posters from memory without touching files of the same name"""
+    for path in paths:
+        posters.release(path)
     
 def final_poster_compare(tmp_poster, plex_poster):
-    size = (2000,3000)
-    cropped = (1000,1500,2000,3000)
-    new_poster = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)
-    new_poster = cv2.cvtColor(new_poster, cv2.COLOR_BGR2RGB)
-    new_poster = Image.fromarray(new_poster)
-    new_poster = new_poster.resize(size,Image.LANCZOS)
-    new_poster = new_poster.crop(cropped)
-
-    plex_poster = cv2.imread(plex_poster, cv2.IMREAD_ANYCOLOR)
-    plex_poster = cv2.cvtColor(plex_poster, cv2.COLOR_BGR2RGB)
-    plex_poster = Image.fromarray(plex_poster)
-    plex_poster = plex_poster.resize(size,Image.LANCZOS)
-    plex_poster = plex_poster.crop(cropped)
-
-    new_poster_hash = imagehash.average_hash(new_poster)
-    plex_poster_hash = imagehash.average_hash(plex_poster)
-
-    if new_poster_hash == plex_poster_hash:
-        logger = get_logger()
+    logger = get_logger()
+    plex = posters.decoded(plex_poster) or read_file(plex_poster)
+    if run_image_job(compare_job, posters.image(tmp_poster), plex):
         logger.debug('Poster is good to upload')
         return True
     else:
-        logger = get_logger()
         logger.debug('poster is fucked')
         return False
 
 def open_poster(tmp_poster, size):
     logger = get_logger()
     try:
-        background = cv2.imread(tmp_poster, cv2.IMREAD_ANYCOLOR)
-        background = cv2.cvtColor(background, cv2.COLOR_BGR2RGB)
-        background = Image.fromarray(background)
-        background = background.resize(size,Image.LANCZOS)
+        background = posters.image(tmp_poster).resize(size,Image.LANCZOS)
         return background
     except  OSError as e:
         logger.error(repr(e)) 
 
+def compose_banners(tmp_poster, overlays, size):
+    """Paste the merged layer for the named overlays with a single decode and save"""
+    logger = get_logger()
+    if not overlays:
+        return
+    try:
+        posters.set_image(tmp_poster, run_image_job(compose_job, posters.image(tmp_poster), tuple(overlays), size))
+    except OSError as e:
+        logger.error('Poster Background error: '+repr(e))
+
+def open_poster_regions(source, size, boxes):
+    """Resample only the given boxes, in poster size coordinates, from the decoded poster"""
+    scale_x = source.size[0] / size[0]
+    scale_y = source.size[1] / size[1]
+    regions = []
+    for box in boxes:
+        src_box = (box[0]*scale_x, box[1]*scale_y, box[2]*scale_x, box[3]*scale_y)
+        regions.append(source.resize((box[2]-box[0], box[3]-box[1]), Image.LANCZOS, box=src_box))
+    return regions
+
 def add_banner(tmp_poster, banner, size):
     logger = get_logger()
     try:
-        background = open_poster(tmp_poster, size)     
+        background = open_poster(tmp_poster, size)
         background.paste(banner, (0, 0), banner)
-        background.save(tmp_poster)
-
+        posters.set_image(tmp_poster, background)
     except OSError as e:
-        logger.error('Poster Background error: '+repr(e))    
+        logger.error('Poster Background error: '+repr(e))
 
 def tv_banner_decision(ep, tmp_poster, banners, audio, hdr, resolution, poster_size):
     logger = get_logger()
     config = get_config()
     
-    banner_4k_icon = Image.open("app/img/tv/4k.png")
-    banner_bg = Image.open("app/img/tv/Background.png")
-    banner_dv = Image.open("app/img/tv/dolby_vision.png")
-    banner_hdr10 = Image.open("app/img/tv/hdr10.png")
-    banner_new_hdr = Image.open("app/img/tv/hdr.png")
-    atmos = Image.open("app/img/tv/atmos.png")
-    dtsx = Image.open("app/img/tv/dtsx.png")
     banner_4k = banners[0]
     audio_banner = banners[1]
     hdr_banner = banners[2]
+    overlays = []
     if True not in banners:
         logger.debug('creating backup')
-        add_banner(tmp_poster, banner_bg, poster_size)
+        overlays.append('tv_background')
     if resolution == '4k' and banner_4k == False:
-           add_banner(tmp_poster, banner_4k_icon, poster_size)
+           overlays.append('tv_4k')
     elif resolution != '4k' and banner_4k == False:
         logger.debug(ep.title+' does not need 4k banner') 
     elif resolution == '4k' and banner_4k != False:
@@ -1013,9 +1791,9 @@ def tv_banner_decision(ep, tmp_poster, banners, audio, hdr, resolution, poster_s
        ):
         if audio_banner == False:
                if 'Atmos' in audio and config.audio_posters == 1:
-                   add_banner(tmp_poster, atmos, poster_size)
+                   overlays.append('tv_atmos')
                elif audio == 'DTS:X' and config.audio_posters == 1:
-                   add_banner(tmp_poster, dtsx, poster_size)
+                   overlays.append('tv_dtsx')
         elif 'Atmos' in audio:
                ep.addLabel('Dolby Atmos', locked=False)
         elif audio == 'DTS:X':
@@ -1024,11 +1802,11 @@ def tv_banner_decision(ep, tmp_poster, banners, audio, hdr, resolution, poster_s
             try:
                 logger.debug(hdr)
                 if 'dolby vision' in hdr and config.hdr == 1:
-                    add_banner(tmp_poster, banner_dv, poster_size)
+                    overlays.append('tv_dolby_vision')
                 elif "hdr10+" in hdr and config.hdr == 1:
-                    add_banner(tmp_poster, banner_hdr10, poster_size)
+                    overlays.append('tv_hdr10')
                 elif hdr != "" and config.hdr == 1:
-                    add_banner(tmp_poster, banner_new_hdr, poster_size)
+                    overlays.append('tv_hdr')
             except:
                 pass
         elif 'dolby vision' in hdr:
@@ -1037,34 +1815,35 @@ def tv_banner_decision(ep, tmp_poster, banners, audio, hdr, resolution, poster_s
             ep.addLabel('HDR10+', locked=False)
         elif hdr != '':
             ep.addLabel('HDR', locked=False)
-    
+    compose_banners(tmp_poster, overlays, poster_size)
+
 
 def film_banner_decision(i, tmp_poster, banners, poster_size, res, audio, hdr):
     logger = get_logger()
     config = get_config()
-    load_image_assets()  # Load images when needed
     
     logger.debug("Banner Decision")
     wide_banner = banners[0]
     mini_banner = banners[1]
     audio_banner = banners[2]
     hdr_banner = banners[3]
+    overlays = []
     if (audio_banner == False and config.audio_posters == 1):
         logger.debug("AUDIO decision: "+audio)         
         if 'atmos' in audio:
-            add_banner(tmp_poster, atmos, poster_size)
+            overlays.append('atmos')
         elif audio == 'dts:x': 
-            add_banner(tmp_poster, atmos, poster_size)
+            overlays.append('atmos')
     if (hdr_banner == False and config.hdr == 1):
         logger.debug("HDR: "+hdr) 
         if 'dolby vision' in str.lower(hdr):
-            add_banner(tmp_poster, banner_dv, poster_size)
+            overlays.append('dolby_vision')
         elif "hdr10+" in str.lower(hdr):
-            add_banner(tmp_poster, banner_hdr10, poster_size)
+            overlays.append('hdr10')
         elif str.lower(hdr) == "none":
             pass
         elif (hdr != "" and str.lower(hdr) != 'none'):
-            add_banner(tmp_poster, banner_new_hdr, poster_size)
+            overlays.append('hdr')
     if 'dolby vision' in str.lower(hdr):
         i.addLabel('Dolby Vision', locked=False)
     elif 'hdr10+' in str.lower(hdr):
@@ -1078,11 +1857,12 @@ def film_banner_decision(i, tmp_poster, banners, poster_size, res, audio, hdr):
     if (res == '4k' and config.films4kposters == 1):
         if wide_banner == mini_banner == False:
             if config.mini4k == 1:
-                add_banner(tmp_poster, mini_4k_banner, poster_size)
+                overlays.append('mini_4k')
             else:
-                add_banner(tmp_poster, banner_4k, poster_size)
+                overlays.append('4k')
         else:
-            logger.debug(i.title+' Has 4k banner')                     
+            logger.debug(i.title+' Has 4k banner')
+    compose_banners(tmp_poster, overlays, poster_size)
 
 
 def clear_old_posters():
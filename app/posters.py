@@ -0,0 +1,110 @@
+import io
+import os
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+# Posters downloaded for a run are kept here by their /tmp path instead of on
+# disk, as their encoded bytes and, once a stage has looked at the pixels, the
+# decoded RGB image. Detection, compositing and the final compare all work on
+# that one decoded image; a stage that changes the pixels swaps in a new image
+# and the bytes are encoded again only when an upload or a backup asks for
+# them. Images are shared between copies, so they are replaced, never changed
+# in place. Paths that were never kept fall through to the file system, so
+# code that still works on real files is unaffected.
+buffers = {}
+buffers_lock = threading.Lock()
+
+def image_format(path):
+    """Pick the encoder for a poster path from its extension"""
+    return Image.registered_extensions().get(os.path.splitext(path)[1].lower(), 'PNG')
+
+def decode(data):
+    """Decode poster bytes into an RGB image"""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    # A blank or broken poster fails here with OpenCV's '!_src.empty()', which callers look for
+    return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+def encode(image, fmt):
+    out = io.BytesIO()
+    image.save(out, fmt)
+    return out.getvalue()
+
+def keep(path, data):
+    """Hold a poster's bytes in memory under its /tmp path"""
+    with buffers_lock:
+        buffers[path] = {'data': data, 'image': None}
+    return path
+
+def keep_image(path, image):
+    """Hold a decoded poster in memory under its /tmp path"""
+    with buffers_lock:
+        buffers[path] = {'data': None, 'image': image}
+    return path
+
+def held(path):
+    return path in buffers
+
+def load(path):
+    """Bytes of a poster, from memory if it's held there, encoding its image if that changed"""
+    entry = buffers.get(path)
+    if entry is None:
+        with open(path, 'rb') as f:
+            return f.read()
+    data = entry['data']
+    if data is None:
+        data = encode(entry['image'], image_format(path))
+        with buffers_lock:
+            if buffers.get(path) is entry:
+                entry['data'] = data
+    return data
+
+def image(path):
+    """Decoded RGB image of a poster, decoding a held poster only the first time it's asked for"""
+    entry = buffers.get(path)
+    if entry is None:
+        with open(path, 'rb') as f:
+            return decode(f.read())
+    img = entry['image']
+    if img is None:
+        img = decode(entry['data'])
+        with buffers_lock:
+            if buffers.get(path) is entry:
+                entry['image'] = img
+    return img
+
+def decoded(path):
+    """The held image of a poster if it has already been decoded"""
+    entry = buffers.get(path)
+    return entry['image'] if entry else None
+
+def set_image(path, img):
+    """Replace a poster's pixels, in memory if it's held there"""
+    with buffers_lock:
+        if path in buffers:
+            buffers[path] = {'data': None, 'image': img}
+            return path
+    with open(path, 'wb') as f:
+        f.write(encode(img, image_format(path)))
+    return path
+
+def copy(src, dst):
+    """Hold a copy of a held poster, sharing its bytes and image"""
+    with buffers_lock:
+        buffers[dst] = dict(buffers[src])
+    return dst
+
+def exists(path):
+    return path in buffers or os.path.exists(path)
+
+def release(path):
+    with buffers_lock:
+        buffers.pop(path, None)
+
+def discard(path):
+    release(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -11,6 +11,7 @@ import threading
 from threading import Thread
 import datetime
 from app import scripts
+from app import module
 date = datetime.datetime.now()
 date = date.strftime("%y.%m.%d-%H%M")
 poster_url_base = 'https://www.themoviedb.org/t/p/original'
@@ -38,7 +39,7 @@ def update_plex_path():
         from app.models import Plex
 
         config = Plex.query.filter(Plex.id == '1').first().all()
-        plex = PlexServer(config.plexurl, config.token)
+        plex = module.get_plex_server(config)
         lib = config.filmslibrary.split(',')
         if len(lib) <= 2:
             try:
@@ -68,7 +69,7 @@ def update_plex_path():
             from app.models import Plex
 
             config = Plex.query.filter(Plex.id == '1').first().all()
-            plex = PlexServer(config.plexurl, config.token)
+            plex = module.get_plex_server(config)
             lib = config.filmslibrary.split(',')
             if len(lib) <= 2:
                 try:
@@ -400,50 +401,47 @@ def get_episodes(var=''):
 
 @app.route('/search', methods=['GET', 'POST'])
 def search():
-    from plexapi.server import PlexServer
-    from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)   
+    config = module.get_config()
+    plex = module.get_plex_server(config)   
     from app.items import Film, Episode, Season, Shows
     if request.method == 'POST':
-        F_results = E_results = S_results = ''
-        lib = config.filmslibrary.split(',')
-        n = len(lib)
-        tvlib = config.tvlibrary.split(',')
-        tvn = len(tvlib)
- 
+        query = request.form['search']
         F_results =[]
         E_results = []
         S_results = []   
         Show_results =[]         
-        for l in range(n):
-            F= plex.library.section(lib[l]).search(title=request.form['search'])
-            for F in F:
-                fdb = db.session.execute(db.select(film_table).where(film_table.title.contains(F.title))).scalars()
-                poster =''
-                for row in fdb:
-                    poster = row.poster
-                F_results.append(Film(F.title, F.guid, F.thumbUrl, poster))
-        for l in range(tvn):
-            ep = plex.library.section(tvlib[l]).search(title=request.form['search'], libtype='episode')
-            for ep in ep:
-                epdb = db.session.execute(db.select(ep_table).where(ep_table.title.contains(ep.title))).scalars()
-                print(ep.title)
-                ep_poster = ''
-                parent_poster = ep.parentThumb
-                parent_guid = ep.parentGuid
-                for row in epdb:
-                    ep_poster = row.poster
-                E_results.append(Episode(ep.title, ep.parentTitle, ep.grandparentTitle, ep.guid, ep.thumbUrl, ep_poster, parent_poster, parent_guid))
-            
-            season = plex.library.section(tvlib[l]).search(title=request.form['search'], libtype='season')
-            for s in season:
-                sdb = db.session.execute(db.select(season_table).where(season_table.title.contains(ep.title))).scalars()
-                s_poster =''
-                for row in sdb:
-                    s_poster = row.poster
-                S_results.append(Season(s.title, s.parentTitle, s.guid, s.thumbUrl, s_poster))
-            show = plex.library.section(tvlib[l]).search(title=request.form['search'], libtype='show')
+        thumb_url = lambda thumb: plex.url(thumb, includeToken=True) if thumb else ''
+        if not module.catalog_fresh(config):
+            Thread(target=module.refresh_catalog, args=[config]).start()
+        if module.catalog_populated(config):
+            # A stale catalog still answers, the refresh above catches it up in the background
+            for section, libtype, title, guid, parent_title, grandparent_title, parent_guid, thumb, parent_thumb, poster in module.search_catalog(config, query):
+                if libtype == 'movie':
+                    F_results.append(Film(title, guid, thumb_url(thumb), poster))
+                elif libtype == 'episode':
+                    E_results.append(Episode(title, parent_title, grandparent_title, guid, thumb_url(thumb), poster, parent_thumb, parent_guid))
+                elif libtype == 'season':
+                    S_results.append(Season(title, parent_title, guid, thumb_url(thumb), poster, parent_thumb, parent_guid))
+                else:
+                    Show_results.append(Shows(title, guid, thumb_url(thumb), backup_poster=''))
+            return render_template('results.html', pagetitle='search', F_results=F_results, S_results=S_results, E_results=E_results, Show_results=Show_results, version=version)
+
+        # Catalog hasn't been filled yet, answer from Plex while it is
+        for lib in config.filmslibrary.split(','):
+            films = plex.library.section(lib).search(title=query)
+            posters = module.stored_posters(film_table, [F.guid for F in films])
+            for F in films:
+                F_results.append(Film(F.title, F.guid, F.thumbUrl, posters.get(F.guid, '')))
+        for lib in config.tvlibrary.split(','):
+            episodes = plex.library.section(lib).search(title=query, libtype='episode')
+            posters = module.stored_posters(ep_table, [ep.guid for ep in episodes])
+            for ep in episodes:
+                E_results.append(Episode(ep.title, ep.parentTitle, ep.grandparentTitle, ep.guid, ep.thumbUrl, posters.get(ep.guid, ''), ep.parentThumb, ep.parentGuid))
+            seasons = plex.library.section(lib).search(title=query, libtype='season')
+            posters = module.stored_posters(season_table, [s.guid for s in seasons])
+            for s in seasons:
+                S_results.append(Season(s.title, s.parentTitle, s.guid, s.thumbUrl, posters.get(s.guid, ''), s.parentThumb, s.parentGuid))
+            show = plex.library.section(lib).search(title=query, libtype='show')
             for s in show:
                 Show_results.append(Shows(s.title, s.guid, s.thumbUrl, backup_poster=''))
 
@@ -1,9 +1,10 @@
 from flask_apscheduler import APScheduler
 from app import app, log
 from apscheduler.triggers.cron import CronTrigger
-from app.scripts import posters3d, hide4k, setup_logger, autocollections, collective4k, maintenance
+from app.scripts import posters3d, hide4k, setup_logger, autocollections, collective4k, maintenance, refresh_catalog
 from app.models import Plex
 from app import db
+from app import module
 import time
 from croniter import croniter
 import os
@@ -18,12 +19,14 @@ scheduler.init_app(app)
 if not scheduler.running:
     scheduler.start()
 scheduler.add_job('maintenance', func=maintenance, args=[app], trigger=CronTrigger.from_crontab('0 4 * * *'))
+scheduler.add_job('catalog', func=refresh_catalog, args=[app], trigger='interval', seconds=module.catalog_ttl)
 def update_scheduler(app):
     with app.app_context():
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         log.debug('Running Updater')
         scheduler.remove_all_jobs()
+        scheduler.add_job('catalog', func=refresh_catalog, args=[app], trigger='interval', seconds=module.catalog_ttl)
         def check_schedule_format(input):
             try:
                 time.strptime(input, '%H:%M')
@@ -97,6 +100,7 @@ def update_scheduler(app):
                 c = Plex.query.get(row)
                 c.plexpath = plexpath
                 db.session.commit()
+                module.invalidate_config()
             except:
                 db.session.rollback()
                 raise log.error()
@@ -16,6 +16,7 @@ import unicodedata
 import cv2
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 
@@ -75,27 +76,11 @@ def posters4k(app, webhooktitle, poster_var):
         from app.models import Plex, film_table
         from app import db
         from app import module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         global b_dir
         tmdb.api_key = config.tmdb_api
         b_dir = 'static/backup/films/'
-        banner_4k = cv2.imread("app/img/4K-Template.png", cv2.IMREAD_UNCHANGED)
-        banner_4k = Image.fromarray(banner_4k)
-        mini_4k_banner = cv2.imread("app/img/4K-mini-Template.png", cv2.IMREAD_UNCHANGED)
-        mini_4k_banner = Image.fromarray(mini_4k_banner)
-        banner_dv = cv2.imread("app/img/dolby_vision.png", cv2.IMREAD_UNCHANGED)
-        banner_dv = Image.fromarray(banner_dv)
-        banner_hdr10 = cv2.imread("app/img/hdr10.png", cv2.IMREAD_UNCHANGED)
-        banner_hdr10 = cv2.cvtColor(banner_hdr10, cv2.COLOR_BGR2RGBA)
-        banner_hdr10 = Image.fromarray(banner_hdr10)
-        
-        banner_new_hdr = cv2.imread("app/img/hdr.png", cv2.IMREAD_UNCHANGED)
-        banner_new_hdr = Image.fromarray(banner_new_hdr)
-        atmos = cv2.imread("app/img/atmos.png", cv2.IMREAD_UNCHANGED)
-        atmos = Image.fromarray(atmos)
-        dtsx = cv2.imread("app/img/dtsx.png", cv2.IMREAD_UNCHANGED)
-        dtsx = Image.fromarray(dtsx)
         blurred=False
         episode=''
         season=''
@@ -103,153 +88,103 @@ def posters4k(app, webhooktitle, poster_var):
         width = 2000
         poster_size = (width, height)
         def run_script(): 
+            def process_film(i):
+
+                def decision_tree(tmp_poster, banners, guid):
+
+                    wide_banner = banners[0]
+                    mini_banner = banners[1]
+                    audio_banner = banners[2]
+                    hdr_banner = banners[3]
+
+                    logger.debug(banners)
+                    logger.debug("Decision tree")
+                    def database_decision(banners):
+                        logger.debug("Database Decision")
+                        audio = hdr = ''
+                        if config.skip_media_info == 1:
+                            if r:
+                                hdr = module.get_plex_hdr(i, plex)
+                                audio = i.media[0].audioCodec
+                                if str(r[0].guid) == guid and r[0].size != size:
+                                    logger.debug(title+" has changed")
 
-            def decision_tree(tmp_poster, banners, guid):
-
-                wide_banner = banners[0]
-                mini_banner = banners[1]
-                audio_banner = banners[2]
-                hdr_banner = banners[3]
-
-                logger.debug(banners)
-                logger.debug("Decision tree")
-                def database_decision(banners):
-                    logger.debug("Database Decision")
-                    audio = hdr = ''
-                    if config.skip_media_info == 1:
-                        if r:
-                            hdr = module.get_plex_hdr(i, plex)
-                            audio = i.media[0].audioCodec
-                            if str(r[0].guid) == guid and str(r[0].size) != str(size):
-                                logger.debug(title+" has changed")
-
-                                module.updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
+                                    module.updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
+                            else:
+                                logger.info(title+" is not in database, skip media info scan is true")
+                                hdr = module.get_plex_hdr(i, plex)
+                                audio = i.media[0].audioCodec
+                                if ('none' not in hdr or ('atmos' or 'dts:x') in audio):
+                                    module.insert_intoTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
                         else:
-                            logger.info(title+" is not in database, skip media info scan is true")
-                            hdr = module.get_plex_hdr(i, plex)
-                            audio = i.media[0].audioCodec
-                            if ('none' not in hdr or ('atmos' or 'dts:x') in audio):
-                                module.insert_intoTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
-                    else:
-                        if r:
-                            if (str(r[0].guid) == guid and str(r[0].size) != str(size)):
-                                logger.debug(title+" has changed, rescanning")
+                            if r:
+                                if (str(r[0].guid) == guid and r[0].size != size):
+                                    logger.debug(title+" has changed, rescanning")
+                                    scan = module.scan_files(config, i, plex)
+                                    audio = str.lower(scan[0])
+                                    hdr = str.lower(scan[1])
+                                    module.updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
+                                else:
+                                    if new_poster == 'True':
+                                        audio = r[0].audio
+                                        hdr = r[0].hdr
+                                        module.updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
+                                    else:
+                                        logger.debug('backing up poster')
+                                        audio = r[0].audio
+                                        hdr = r[0].hdr
+                                        module.backup_poster(tmp_poster, banners, config, r, i, b_dir, g, episode, season, guid)
+                            elif not r:
+                                logger.info(title+" is not in database, skip media info scan is false")
                                 scan = module.scan_files(config, i, plex)
                                 audio = str.lower(scan[0])
                                 hdr = str.lower(scan[1])
-                                module.updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
+                                if ('none' not in hdr or ('atmos' or 'dts:x') in audio or res == '4k'):
+                                    module.insert_intoTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
                             else:
-                                if new_poster == 'True':
-                                    audio = r[0].audio
-                                    hdr = r[0].hdr
-                                    module.updateTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
-                                else:
-                                    logger.debug('backing up poster')
-                                    audio = r[0].audio
-                                    hdr = r[0].hdr
-                                    module.backup_poster(tmp_poster, banners, config, r, i, b_dir, g, episode, season, guid)
-                        elif not r:
-                            logger.info(title+" is not in database, skip media info scan is false")
-                            scan = module.scan_files(config, i, plex)
-                            audio = str.lower(scan[0])
-                            hdr = str.lower(scan[1])
-                            if ('none' not in hdr or ('atmos' or 'dts:x') in audio or res == '4k'):
-                                module.insert_intoTable(guid, guids, size, res, hdr, audio, tmp_poster, banners, title, config, table, db, r, i, b_dir, g, blurred, episode, season)
-                        else:
-                            logger.debug("error message")
-                    return audio, hdr
-
-                def banner_decision(audio, hdr):
-                    logger.debug("Banner Decision")
-                    if (audio_banner == False and config.audio_posters == 1):
-                        logger.debug("AUDIO decision: "+audio)         
-                        if 'atmos' in audio:
-                            module.add_banner(tmp_poster, atmos, poster_size)
-                            #atmos_poster(tmp_poster)
-                        elif audio == 'dts:x': 
-                            module.add_banner(tmp_poster, atmos, poster_size)
-                            #dtsx_poster(tmp_poster)
-
-                    if (hdr_banner == False and config.hdr == 1):
-                        logger.debug("HDR: "+hdr) 
-                        if 'dolby vision' in str.lower(hdr):
-                            module.add_banner(tmp_poster, banner_dv, poster_size)
-                            #dolby_vision(tmp_poster)
-                        elif "hdr10+" in str.lower(hdr):
-                            module.add_banner(tmp_poster, banner_hdr10, poster_size)
-                            #hdr10(tmp_poster)
-                        elif str.lower(hdr) == "none":
-                            pass
-                        elif (hdr != "" and str.lower(hdr) != 'none'):
-                            module.add_banner(tmp_poster, banner_new_hdr, poster_size)
-                            #hdrp(tmp_poster)
-                    if 'dolby vision' in str.lower(hdr):
-                        i.addLabel('Dolby Vision', locked=False)
-                    elif 'hdr10+' in str.lower(hdr):
-                        i.addLabel('HDR10+', locked=False)
-                    elif hdr != '':
-                        i.addLabel('HDR', locked=False)
-
-                    if 'atmos' in audio:
-                        i.addLabel('Dolby Atmos', locked=False)
-                    elif audio == 'dts:x':
-                        i.addLabel('DTS:X', locked=False) 
-
-                    if (res == '4k' and config.films4kposters == 1):
-                        if wide_banner == mini_banner == False:
-                            if config.mini4k == 1:
-                                module.add_banner(tmp_poster, mini_4k_banner, poster_size)
-                            else:
-                                module.add_banner(tmp_poster, banner_4k, poster_size)
-                            #add_banner(tmp_poster)
-                        else:
-                            logger.debug(i.title+' Has 4k banner')                 
-
-                audio_hdr = database_decision(banners)
-                audio = audio_hdr[0]
-                hdr = audio_hdr[1]
-                logger.debug(audio+" "+hdr)
-                banner_decision(audio, hdr)
-                return(audio, hdr)
-
-            def process(tmp_poster, guid):
-                size = (2000, 3000)
-                banners = module.check_banners(tmp_poster, size)
-                audio_hdr = decision_tree(tmp_poster, banners, guid)
-                bname = re.sub('plex://movie/', '', guid)
-                banner_file = '/config/backup/bannered_films/'+bname+'.png'
-                banners = module.check_banners(tmp_poster, size)
-                if (True in banners and config.backup == 1):
-                    module.add_bannered_poster_to_db(tmp_poster, db, title, table, guid, banner_file)
-
-                if (
-                    'none' not in audio_hdr[1]
-                    or 'atmos' in str.lower(audio_hdr[0])
-                    or 'dts:x' in str.lower(audio_hdr[0])
-                    or res == '4k'
-                ):
-                    logger.debug(str(audio_hdr)+' - '+res)
-                    r = film_table.query.filter(film_table.guid == guid).all()
-                    #logger.warning('upload poster would happen now but is disabled')
-                    poster_good = module.final_poster_compare(tmp_poster, plex_poster)
-                    if poster_good == True:
-                        module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
-                    else: 
-                        logger.debug('It looks like there may be some corruption, not uploading poster for: '+title) 
-                else:
-                    logger.debug('Not uploading poster for: '+title)  
-            def add_url(i, r, table, plex):
-                try:
-                    url = "https://app.plex.tv/desktop#!/server/"+str(plex.machineIdentifier)+'/details?key=%2Flibrary%2Fmetadata%2F'+str(i.ratingKey)
-                    row = r[0].id
-                    film = table.query.get(row)
-                    film.url = url
-                    db.session.commit()
-                except:
-                    db.session.rollback()
-                    raise logger.error(Exception)
+                                logger.debug("error message")
+                        return audio, hdr
 
-            for i in films.search(title=webhooktitle):
+                    def banner_decision(audio, hdr):
+                        module.film_banner_decision(i, tmp_poster, banners, poster_size, res, audio, hdr)
+
+                    audio_hdr = database_decision(banners)
+                    audio = audio_hdr[0]
+                    hdr = audio_hdr[1]
+                    logger.debug(audio+" "+hdr)
+                    banner_decision(audio, hdr)
+                    return(audio, hdr)
+
+                def process(tmp_poster, guid):
+                    size = (2000, 3000)
+                    banners = module.check_banners(tmp_poster, size)
+                    audio_hdr = decision_tree(tmp_poster, banners, guid)
+                    bname = re.sub('plex://movie/', '', guid)
+                    banner_file = '/config/backup/bannered_films/'+bname+'.png'
+                    banners = module.check_banners(tmp_poster, size)
+                    if (True in banners and config.backup == 1):
+                        module.add_bannered_poster_to_db(tmp_poster, db, title, table, guid, banner_file)
+
+                    if (
+                        'none' not in audio_hdr[1]
+                        or 'atmos' in str.lower(audio_hdr[0])
+                        or 'dts:x' in str.lower(audio_hdr[0])
+                        or res == '4k'
+                    ):
+                        logger.debug(str(audio_hdr)+' - '+res)
+                        r = module.find_rows(db, film_table, guid)
+                        #logger.warning('upload poster would happen now but is disabled')
+                        poster_good = module.final_poster_compare(tmp_poster, plex_poster)
+                        if poster_good == True:
+                            module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
+                        else: 
+                            logger.debug('It looks like there may be some corruption, not uploading poster for: '+title) 
+                    else:
+                        logger.debug('Not uploading poster for: '+title)  
+                def add_url(i, r, table, plex):
+                    module.queue_write(db, table, r[0].guid, url=module.plex_item_url(i))
+
+                tmp_poster = plex_poster = ''
                 try:
                     table = film_table
                     i.title = unicodedata.normalize('NFD', i.title).encode('ascii', 'ignore').decode('utf8')
@@ -260,17 +195,20 @@ def posters4k(app, webhooktitle, poster_var):
                     guids = str(i.guids)
                     g = guids
                     size = i.media[0].parts[0].size
-                    r = table.query.filter(table.guid == guid).all()
+                    r = module.lookup_rows(rows, table, guid)
                     res = i.media[0].videoResolution    
+                    if (poster_var == '' and r and r[0].size == size and module.poster_unchanged(i, r)):
+                        logger.info(title+' poster has not changed since the last run, skipping')
+                        return
                     t = re.sub('plex://movie/', '', guid)
                     tmp_poster = re.sub(' ','_', '/tmp/'+t+'_poster.png')
                     plex_poster = re.sub(' ','_', '/tmp/'+t+'_plex_poster.png')
                     if poster_var == '':
-                        g_poster = module.get_poster(i, tmp_poster, title, b_dir, height, width, r) 
+                        g_poster = module.get_poster(i, tmp_poster, title, b_dir, height, width, r, prefetch) 
                         tmp_poster = g_poster[0]
                     else:
                         tmp_poster = module.get_tmdb_poster(tmp_poster, poster_var) 
-                    plex_poster = shutil.copy(tmp_poster, plex_poster)
+                    plex_poster = module.copy_poster(tmp_poster, plex_poster)
                     new_poster = ''
                     if r:
                         logger.debug(g_poster[1])
@@ -282,7 +220,7 @@ def posters4k(app, webhooktitle, poster_var):
                         try:
                             if (
                                 r[0].checked == 0
-                                or str(r[0].size) != str(size)
+                                or r[0].size != size
                                 or new_poster == 'True'
                             ):
                                 logger.debug('Processing '+i.title)
@@ -298,6 +236,7 @@ def posters4k(app, webhooktitle, poster_var):
                                 logger.error("Poster has returned a blank image, enable TMDB restore to continue with a poster from TheMovieDB")
                             else:
                                 logger.info(title+' has been processed and the file has not changed, skiping')
+                                module.record_poster_state(i, r, table, db)
                         except Exception as e:
                             logger.error(repr(e))
                         add_url(i, r, table, plex)
@@ -307,7 +246,47 @@ def posters4k(app, webhooktitle, poster_var):
                         process(tmp_poster, guid)
                 except Exception as e:
                     logger.error("script error: "+repr(e))
-            module.clear_old_posters()      
+                finally:
+                    module.remove_tmp_files(tmp_poster)
+                    module.remove_tmp_files(plex_poster)
+
+            def process_film_in_context(i):
+                with app.app_context():
+                    process_film(i)
+
+            items = films.search(title=webhooktitle)
+            rows = module.preload_rows(film_table, db) if len(items) > 1 else None
+            if config.skip_media_info != 1:
+                changed = module.changed_guids(film_table, {str(i.guid): i.media[0].parts[0].size for i in items})
+                module.schedule_probes(config, [i for i in items if str(i.guid) in changed])
+            prefetch = None
+            try:
+                if rows is not None and poster_var == '':
+                    # Only the films that get past the unchanged poster check look at their streams
+                    pending = module.changed_posters(items, rows, film_table)
+                    module.prefetch_stream_info(plex, pending)
+                    prefetch = module.prefetch_posters(pending, height, width)
+                workers = int(config.workers or 1)
+                with module.batched_writes(db):
+                    if (workers > 1 and len(items) > 1):
+                        logger.info('Processing '+str(len(items))+' films with '+str(workers)+' workers')
+                        with module.image_workers(workers), ThreadPoolExecutor(max_workers=workers) as executor:
+                            futures = {executor.submit(process_film_in_context, i): i for i in items}
+                            for n, future in enumerate(as_completed(futures), 1):
+                                try:
+                                    future.result()
+                                except Exception as e:
+                                    logger.error(futures[future].title+': '+repr(e))
+                                logger.info('Processed '+str(n)+' of '+str(len(items))+' films')
+                    else:
+                        for i in items:
+                            process_film(i)
+            finally:
+                module.clear_probes()
+                if prefetch:
+                    prefetch.close()
+                module.clear_stream_info()
+                module.clear_old_posters()
             logger.info('4k Poster script has finished')
             
         lib = config.filmslibrary.split(',')
@@ -324,9 +303,9 @@ def posters4k(app, webhooktitle, poster_var):
 def guid_to_title(app, var):
     with app.app_context():
         logger.debug(var)
-        from app import models
-        config = models.Plex.query.filter(models.Plex.id == '1')
-        plex = PlexServer(config.plexurl, config.token)
+        from app import models, module, db
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         if 'movie' in var:
             def run_script():
                 for i in films.search(guid=var):
@@ -341,6 +320,7 @@ def guid_to_title(app, var):
                         row = r[0].id
                         film = models.film_table.query.get(row)
                         film.bannered_poster = ''
+                        film.thumb = None
                         db.session.commit()
                     except Exception as e:
                         db.session.rollback()
@@ -360,6 +340,7 @@ def guid_to_title(app, var):
                     pass  
         elif 'episode' in var:
             def run_script():
+                module.forget_poster_state(models.ep_table, var, db)
                 tv_episode_poster(app, var, '')
 
             tvlib = config.tvlibrary
@@ -384,6 +365,7 @@ def guid_to_title(app, var):
                     pass    
         elif 'local' in var:
             def run_script():
+                module.forget_poster_state(models.ep_table, var, db)
                 tv_episode_poster(app, var, '')
 
             tvlib = config.tvlibrary
@@ -414,15 +396,8 @@ def tv_episode_poster(app, epwebhook, poster):
         from app.models import Plex, ep_table, season_table
         from app import db
         from app import module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
-        banner_4k_icon = Image.open("app/img/tv/4k.png")
-        banner_bg = Image.open("app/img/tv/Background.png")
-        banner_dv = Image.open("app/img/tv/dolby_vision.png")
-        banner_hdr10 = Image.open("app/img/tv/hdr10.png")
-        banner_new_hdr = Image.open("app/img/tv/hdr.png")
-        atmos = Image.open("app/img/tv/atmos.png")
-        dtsx = Image.open("app/img/tv/dtsx.png")
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api    
         b_dir = 'static/backup/tv/episodes/'
         poster_size = (1280, 720)
@@ -442,7 +417,7 @@ def tv_episode_poster(app, epwebhook, poster):
                         hdr= r[0].hdr
                         if str(r[0].guid) == guid:
                             logger.debug(title+' GUID match')
-                            if str(r[0].size) != size:
+                            if r[0].size != size:
                                     logger.debug(title+" has changed, rescanning")
                                     scan = module.scan_files(config, i, plex)
                                     audio = scan[0]
@@ -475,12 +450,13 @@ def tv_episode_poster(app, epwebhook, poster):
                             logger.warning('Database decision: '+repr(e))
 
                     def banner_decision(audio, hdr):
+                        overlays = []
                         if True not in banners:
                             logger.debug('creating backup')
-                            module.add_banner(tmp_poster, banner_bg, poster_size)
+                            overlays.append('tv_background')
 
                         if resolution == '4k' and banner_4k == False:
-                            module.add_banner(tmp_poster, banner_4k_icon, poster_size)
+                            overlays.append('tv_4k')
                         elif resolution != '4k' and banner_4k == False:
                             logger.debug(img_title+' does not need 4k banner') 
                         elif resolution == '4k' and banner_4k != False:
@@ -496,9 +472,9 @@ def tv_episode_poster(app, epwebhook, poster):
 
                             if audio_banner == False:
                                 if 'Atmos' in audio and config.audio_posters == 1:
-                                    module.add_banner(tmp_poster, atmos, poster_size)
+                                    overlays.append('tv_atmos')
                                 elif audio == 'DTS:X' and config.audio_posters == 1:
-                                    module.add_banner(tmp_poster, dtsx, poster_size)
+                                    overlays.append('tv_dtsx')
 
                             elif 'Atmos' in audio:
                                 ep.addLabel('Dolby Atmos', locked=False)
@@ -508,11 +484,11 @@ def tv_episode_poster(app, epwebhook, poster):
                                 try:
                                     logger.debug(hdr)
                                     if 'dolby vision' in hdr and config.hdr == 1:
-                                        module.add_banner(tmp_poster, banner_dv, poster_size)
+                                        overlays.append('tv_dolby_vision')
                                     elif "hdr10+" in hdr and config.hdr == 1:
-                                        module.add_banner(tmp_poster, banner_hdr10, poster_size)
+                                        overlays.append('tv_hdr10')
                                     elif hdr != "" and config.hdr == 1:
-                                        module.add_banner(tmp_poster, banner_new_hdr, poster_size)
+                                        overlays.append('tv_hdr')
                                 except:
                                     pass
                             elif 'dolby vision' in hdr:
@@ -521,14 +497,16 @@ def tv_episode_poster(app, epwebhook, poster):
                                 ep.addLabel('HDR10+', locked=False)
                             elif hdr != '':
                                 ep.addLabel('HDR', locked=False)
-                    banner_decision(audio, hdr)
-                database_decision(r)             
+                        return overlays
+                    return banner_decision(audio, hdr)
+                overlays = database_decision(r)             
 
                 if res == '4k' and config.films4kposters == 1:
                     if banner_4k == False:
-                        module.add_banner(tmp_poster, banner_4k_icon, poster_size)
+                        overlays.append('tv_4k')
                     else:
                         logger.debug(ep.title+' Has banner') 
+                module.compose_banners(tmp_poster, overlays, poster_size)
 
 
             advanced_filters = {
@@ -537,129 +515,149 @@ def tv_episode_poster(app, epwebhook, poster):
                     {'hdr': True}
                 ]
             }
-            for ep in tv.search(libtype='episode', guid=epwebhook, filters=advanced_filters):
-                try:
-                    logger.debug(ep.title)
-                    i = ep
-                    img_title = ep.grandparentTitle+"_"+ep.parentTitle+"_"+ep.title
-                    resolution = ep.media[0].videoResolution
-                    title = ep.title
-                    logger.info(img_title)
-                    guid = str(ep.guid)
-                    guids = str(ep.guids)
-                    size = ep.media[0].parts[0].size
-                    res = ep.media[0].videoResolution 
-                    hdr = module.get_plex_hdr(ep, plex)
-                    height = 720
-                    width = 1280
-                    if 'plex://' in guid:
-                        tmp_poster = re.sub('plex://episode/', '/tmp/', guid)+'.png'     
-                    elif 'local://' in guid:
-                        tmp_poster = re.sub('local://', '/tmp/', guid)+'.png'   
-
-                    if (res == '4k' or hdr != 'none'):
-                        r = ep_table.query.filter(ep_table.guid == guid).all()
-                        if poster == "":
-                            tmp_poster = module.get_poster(i, tmp_poster, title, b_dir, height, width, r)
-                            tmp_poster = tmp_poster[0]
-                            blurred = False
-                        else:
-                            blurred = True
-                            tmp_poster = poster
-                        print(tmp_poster)
-                        table = ep_table
-                        g = [s for s in tv.search(libtype='show', guid=i.grandparentGuid)]
-                        g = str(g[0].guids)
-                        logger.debug(g)
+            episodes = tv.search(libtype='episode', guid=epwebhook, filters=advanced_filters)
+            # The search already keeps to 4k and HDR episodes, and each one's HDR format
+            # is read even when its poster is unchanged, for its season's banners
+            module.prefetch_stream_info(plex, episodes)
+            rows = module.preload_rows(ep_table, db) if len(episodes) > 1 else None
+            prefetch = None
+            if rows is not None and poster == '':
+                prefetch = module.prefetch_posters(module.changed_posters(episodes, rows, ep_table), 720, 1280)
+            with module.batched_writes(db):
+                for ep in episodes:
+                    tmp_poster = season_poster = ''
+                    try:
+                        logger.debug(ep.title)
+                        i = ep
+                        img_title = ep.grandparentTitle+"_"+ep.parentTitle+"_"+ep.title
+                        resolution = ep.media[0].videoResolution
+                        title = ep.title
+                        logger.info(img_title)
+                        guid = str(ep.guid)
+                        guids = str(ep.guids)
+                        size = ep.media[0].parts[0].size
+                        res = ep.media[0].videoResolution 
+                        hdr = module.get_plex_hdr(ep, plex)
+                        height = 720
+                        width = 1280
                         if 'plex://' in guid:
-                            bname = re.sub('plex://episode/', '', guid)
-                        else:
-                            bname = re.sub('local://', '', guid)
-                        banner_file = '/config/backup/tv/bannered_episodes/'+bname+'.png'
-                        try:
-                            if r[0].checked == 1:
-                                logger.info(ep.title+' has been checked, checking to see if the file has changed')
-                                if str(r[0].size) == str(size):
-                                        logger.info(title+' has been processed and the file has not changed, skiping scan')
-                                        new_poster = module.check_for_new_poster(tmp_poster, r, ep, table, db)
-                                        if new_poster != 'False':
-                                            decision_tree(tmp_poster)
-                                            r = ep_table.query.filter(ep_table.guid == guid).all()                               
-                                            module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
-                                else:
-                                    decision_tree(tmp_poster)
-                                    r = ep_table.query.filter(ep_table.guid == guid).all()                          
-                                    module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
+                            tmp_poster = re.sub('plex://episode/', '/tmp/', guid)+'.png'     
+                        elif 'local://' in guid:
+                            tmp_poster = re.sub('local://', '/tmp/', guid)+'.png'   
+
+                        if (res == '4k' or hdr != 'none'):
+                            r = module.lookup_rows(rows, ep_table, guid)
+                            unchanged = (poster == "" and r and r[0].size == size and module.poster_unchanged(ep, r))
+                            if unchanged:
+                                blurred = False
+                            elif poster == "":
+                                tmp_poster = module.get_poster(i, tmp_poster, title, b_dir, height, width, r, prefetch)
+                                tmp_poster = tmp_poster[0]
+                                blurred = False
                             else:
-                                new_poster = module.check_for_new_poster(tmp_poster, r, ep, table, db)
-                                if new_poster == 'False':
-                                    decision_tree(tmp_poster)
-                                    r = ep_table.query.filter(ep_table.guid == guid).all()
-                                    module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
-
-
-
-                        except IndexError: 
-                            new_poster = module.check_for_new_poster(tmp_poster, r, ep, table, db)
-                            if new_poster != 'False':
-                                decision_tree(tmp_poster)
-                                r = ep_table.query.filter(ep_table.guid == guid).all()
-                                module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
-                        logger.debug(tmp_poster)
-                        rechk_banners = module.check_tv_banners(i, tmp_poster, img_title)
-                        logger.debug('Rechecked banners: '+str(rechk_banners))
-                        if (True in rechk_banners and config.backup == 1):
-                            module.add_bannered_poster_to_db(tmp_poster, db, title, table, guid, banner_file)
-                        try:
-                            os.remove(tmp_poster)
-                        except:
-                            pass
-                        try:
-                            logger.info("Season Poster")
-                            pguid = ep.parentGuid
-                            rs = season_table.query.filter(season_table.guid == pguid).all()
+                                blurred = True
+                                tmp_poster = poster
+                            print(tmp_poster)
+                            table = ep_table
+                            g = [s for s in tv.search(libtype='show', guid=i.grandparentGuid)]
+                            g = str(g[0].guids)
+                            logger.debug(g)
                             if 'plex://' in guid:
-                                st = re.sub('plex://season/', '', pguid)
+                                bname = re.sub('plex://episode/', '', guid)
                             else:
-                                st = re.sub('local://', '', pguid)
-                            season_poster = re.sub(' ','_', '/tmp/'+st+'_poster.png')
-                            logger.debug(season_poster)
-                            season_poster = module.get_season_poster(ep, season_poster, config)    
-                            new_poster = module.check_for_new_poster(season_poster, rs, i, table, db)
-                            size = (2000, 3000)
-                            s_banners = module.check_banners(season_poster, size)
-                            logger.debug('Season poster banners: '+str(s_banners))
-                            logger.debug('Season poster: '+str(new_poster))
-                            if ('True' in s_banners or new_poster != 'True'):
-                                logger.info('Skipping season poster')
+                                bname = re.sub('local://', '', guid)
+                            banner_file = '/config/backup/tv/bannered_episodes/'+bname+'.png'
+                            if unchanged:
+                                logger.info(title+' poster has not changed since the last run, skipping')
                             else:
-                                s_bak = '/config/backup/tv/seasons/'+st+'.png'
-                                for b in str(s_banners):
-                                    banner_index = b.find('True')
-                                if (banner_index < 0):
-                                    shutil.copy(season_poster, s_bak)
-                                    if os.path.exists(s_bak) != True:
-                                        raise Exception("Season poster has not copied")
-                                module.season_decision_tree(config, s_banners, ep, hdr, res, season_poster)
-                                banner_file = '/config/backup/tv/bannered_seasons/'+st+'.png'
+                                try:
+                                    if r[0].checked == 1:
+                                        logger.info(ep.title+' has been checked, checking to see if the file has changed')
+                                        if r[0].size == size:
+                                                logger.info(title+' has been processed and the file has not changed, skiping scan')
+                                                new_poster = module.check_for_new_poster(tmp_poster, r, ep, table, db)
+                                                if new_poster == 'False':
+                                                    module.record_poster_state(i, r, table, db)
+                                                else:
+                                                    decision_tree(tmp_poster)
+                                                    r = module.find_rows(db, ep_table, guid)                               
+                                                    module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
+                                        else:
+                                            decision_tree(tmp_poster)
+                                            r = module.find_rows(db, ep_table, guid)                          
+                                            module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
+                                    else:
+                                        new_poster = module.check_for_new_poster(tmp_poster, r, ep, table, db)
+                                        if new_poster == 'False':
+                                            decision_tree(tmp_poster)
+                                            r = module.find_rows(db, ep_table, guid)
+                                            module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
+
+
+
+                                except IndexError: 
+                                    new_poster = module.check_for_new_poster(tmp_poster, r, ep, table, db)
+                                    if new_poster != 'False':
+                                        decision_tree(tmp_poster)
+                                        r = module.find_rows(db, ep_table, guid)
+                                        module.upload_poster(tmp_poster, title, db, r, table, i, banner_file)
+                                logger.debug(tmp_poster)
+                                rechk_banners = module.check_tv_banners(i, tmp_poster, img_title)
+                                logger.debug('Rechecked banners: '+str(rechk_banners))
+                                if (True in rechk_banners and config.backup == 1):
+                                    module.add_bannered_poster_to_db(tmp_poster, db, title, table, guid, banner_file)
+                                module.remove_tmp_files(tmp_poster)
+                            try:
+                                logger.info("Season Poster")
+                                pguid = ep.parentGuid
+                                rs = module.find_rows(db, season_table, pguid)
+                                if 'plex://' in guid:
+                                    st = re.sub('plex://season/', '', pguid)
+                                else:
+                                    st = re.sub('local://', '', pguid)
+                                season_poster = re.sub(' ','_', '/tmp/'+st+'_poster.png')
+                                logger.debug(season_poster)
+                                season_poster = module.get_season_poster(ep, season_poster, config)    
+                                new_poster = module.check_for_new_poster(season_poster, rs, i, table, db)
+                                size = (2000, 3000)
                                 s_banners = module.check_banners(season_poster, size)
-                                shutil.copy(season_poster, banner_file)
-                                if os.path.exists(banner_file) != True:
-                                    raise Exception("Season poster has not copied")
-                                title = ep.grandparentTitle
-                                table = season_table
-                                module.add_season_to_db(db, title, table, pguid, banner_file, s_bak) 
-                                #db.session.close()                       
-                                for s in tv.search(guid=pguid, libtype='season'):
-                                    #r = season_table.query.filter(season_table.guid == pguid).all()
-                                    s.uploadPoster(filepath=season_poster)
-                                    #module.upload_poster(season_poster, title, db, rs, table, s, banner_file)
-                            #module.remove_tmp_files(season_poster)
-                        except Exception as e:
-                            logger.error("Season poster Error: "+repr(e))
-                            pass
-                except Exception as e:
-                    logger.error(i.title+ ' '+repr(e))
+                                logger.debug('Season poster banners: '+str(s_banners))
+                                logger.debug('Season poster: '+str(new_poster))
+                                if ('True' in s_banners or new_poster != 'True'):
+                                    logger.info('Skipping season poster')
+                                else:
+                                    s_bak = '/config/backup/tv/seasons/'+st+'.png'
+                                    for b in str(s_banners):
+                                        banner_index = b.find('True')
+                                    if (banner_index < 0):
+                                        module.copy_backup(season_poster, s_bak)
+                                        if os.path.exists(s_bak) != True:
+                                            raise Exception("Season poster has not copied")
+                                    module.season_decision_tree(config, s_banners, ep, hdr, res, season_poster)
+                                    banner_file = '/config/backup/tv/bannered_seasons/'+st+'.png'
+                                    s_banners = module.check_banners(season_poster, size)
+                                    module.copy_backup(season_poster, banner_file)
+                                    if os.path.exists(banner_file) != True:
+                                        raise Exception("Season poster has not copied")
+                                    title = ep.grandparentTitle
+                                    table = season_table
+                                    module.add_season_to_db(db, title, table, pguid, banner_file, s_bak) 
+                                    #db.session.close()                       
+                                    for s in tv.search(guid=pguid, libtype='season'):
+                                        #r = season_table.query.filter(season_table.guid == pguid).all()
+                                        module.send_poster(s, module.read_file(season_poster))
+                                        #module.upload_poster(season_poster, title, db, rs, table, s, banner_file)
+                                module.remove_tmp_files(season_poster)
+                            except Exception as e:
+                                logger.error("Season poster Error: "+repr(e))
+                                pass
+                    except Exception as e:
+                        logger.error(i.title+ ' '+repr(e))
+                    finally:
+                        module.release_tmp_files(tmp_poster, season_poster)
+            if prefetch:
+                prefetch.close()
+            module.clear_stream_info()
             #module.clear_old_posters()  
             logger.info("tv Poster Script has finished")
             
@@ -688,8 +686,8 @@ def restore_episodes_from_database(app, b_dir):
         from app.models import Plex, ep_table
         from app import db, module
         from tmdbv3api import TMDb, Search, Movie, Discover, TV, Episode
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tv = plex.library.section(config.tvlibrary)
         tmdb = TMDb()
         poster_url_base = 'https://www.themoviedb.org/t/p/original'
@@ -703,14 +701,10 @@ def restore_episodes_from_database(app, b_dir):
         width = 1280
         def run_script():
             def get_poster(poster):
-                req = requests.get(poster_url_base+poster, stream=True)
-                if req.status_code == 200:
-                    logger.debug(b_file)
-                    with open(b_file, 'wb') as f:
-                        for chunk in req:
-                            f.write(chunk)
-                        #shutil.copyfileobj(req.raw, f)
-                        i.uploadPoster(filepath=b_file)
+                # Swap the file in, b_file may be a hard link into the backup blob store
+                logger.debug(b_file)
+                if module.get_tmdb_poster(b_file, poster):
+                    i.uploadPoster(filepath=b_file)
             def restore_tmdb(g):
                 logger.info("RESTORE: restoring posters from TheMovieDb")
                 tmdb_search = ''
@@ -778,8 +772,8 @@ def restore_episodes_from_database(app, b_dir):
                                     restore_tmdb(g)
                                 row = r[0].id
                                 film = ep_table.query.get(row)
-                                film.checked = '0'
-                                film.blurred = '0'
+                                film.checked = 0
+                                film.blurred = 0
                                 db.session.commit()
                             except (TypeError, IndexError, FileNotFoundError) as e:
                                 logger.error('Restore from db: '+repr(e))  
@@ -821,8 +815,8 @@ def restore_episode_from_database(app, var):
         from app.models import Plex, ep_table
         from app import db, module
         from tmdbv3api import TMDb, Search, Movie, Discover, TV, Episode
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb = TMDb()
         poster_url_base = 'https://www.themoviedb.org/t/p/original'
         search = Search()
@@ -842,14 +836,10 @@ def restore_episode_from_database(app, var):
                         tmdb_search = tmdbtv.details(tv_id=s.id, episode_num=episode, season_num=season)
                 logger.debug(tmdb_search.still_path)
                 def get_poster(poster):
-                    req = requests.get(poster_url_base+poster, stream=True)
-                    if req.status_code == 200:
-                        logger.debug(b_file)
-                        with open(b_file, 'wb') as f:
-                            for chunk in req:
-                                f.write(chunk)                        
-                            #shutil.copyfileobj(req.raw, f)
-                            i.uploadPoster(filepath=b_file)
+                    # Swap the file in, b_file may be a hard link into the backup blob store
+                    logger.debug(b_file)
+                    if module.get_tmdb_poster(b_file, poster):
+                        i.uploadPoster(filepath=b_file)
                 try:
                     poster = tmdb_search.still_path
                     get_poster(poster) 
@@ -902,8 +892,8 @@ def restore_episode_from_database(app, var):
                                 restore_tmdb(g)
                             row = r[0].id
                             film = ep_table.query.get(row)
-                            film.checked = '0'
-                            film.blurred = '0'
+                            film.checked = 0
+                            film.blurred = 0
                             db.session.commit()
                         except (TypeError, IndexError, FileNotFoundError) as e:
                             logger.error('Restore from db: '+repr(e))  
@@ -942,11 +932,12 @@ def restore_episode_from_database(app, var):
 def posters3d(app): 
     with app.app_context():
         from app.models import Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api
 
-        plex = PlexServer(config.plexurl, config.token)
+        plex = module.get_plex_server(config)
         films = plex.library.section(config.library3d)
         if config.posters3d == 1:
 
@@ -954,8 +945,7 @@ def posters3d(app):
             banner_3d = Image.open("app/img/3D-Template.png")
             mini_3d_banner = Image.open("app/img/3D-mini-Template.png")
 
-            chk_banner = Image.open("app/img/chk_3d_wide.png")
-            chk_mini_banner = Image.open("app/img/chk-3D-mini.png")
+            chk_hashes = module.get_reference_hashes()['3d']
 
             size = (911,1367)
             box= (0,0,911,100)
@@ -968,7 +958,7 @@ def posters3d(app):
                 background = background.resize(size,Image.ANTIALIAS)
                 backgroundchk = background.crop(mini_box)
                 hash0 = imagehash.average_hash(backgroundchk)
-                hash1 = imagehash.average_hash(chk_mini_banner)
+                hash1 = chk_hashes['mini_banner']
                 cutoff= 15
                 if hash0 - hash1 < cutoff:
                     logger.info('3D Posters: Mini 3D banner exists, moving on...')
@@ -982,7 +972,7 @@ def posters3d(app):
                 background = background.resize(size,Image.ANTIALIAS)
                 backgroundchk = background.crop(box)
                 hash0 = imagehash.average_hash(backgroundchk)
-                hash1 = imagehash.average_hash(chk_banner)
+                hash1 = chk_hashes['banner']
                 cutoff= 5
                 if hash0 - hash1 < cutoff:
                     logger.info('3D Posters: 3D banner exists, moving on...')
@@ -1054,8 +1044,9 @@ def restore_from_database(app):
     with app.app_context():    
         from app.models import Plex, film_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         films = plex.library.section('Films')
         def convert_data(data, file_name):
             with open(file_name, 'wb') as file:
@@ -1074,7 +1065,7 @@ def restore_from_database(app):
                     i.uploadPoster(filepath=b_file)
                     row = r[0].id
                     film = film_table.query.get(row)
-                    film.checked = '0'
+                    film.checked = 0
                     db.session.commit()
                 except (TypeError, IndexError, FileNotFoundError) as e:
                     logger.error(repr(e))  
@@ -1094,8 +1085,9 @@ def restore_from_database(app):
 def restore_single(var):
         from app.models import Plex, film_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         def run_script():
             for i in films.search(guid=var):
                 title = i.title
@@ -1109,7 +1101,7 @@ def restore_single(var):
                     i.uploadPoster(filepath=b_file)
                     row = r[0].id
                     film = film_table.query.get(row)
-                    film.checked = '0'
+                    film.checked = 0
                     film.bannered_poster = ''
                     db.session.commit()
                     db.session.close()
@@ -1131,8 +1123,9 @@ def restore_single(var):
 def restore_single_bannered(app, var):
         from app.models import Plex, film_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         msg = 'no message'
         def run_script():
             for i in films.search(guid=var):
@@ -1148,7 +1141,7 @@ def restore_single_bannered(app, var):
                     i.uploadPoster(filepath=b_file)
                     row = r[0].id
                     film = film_table.query.get(row)
-                    film.checked = '1'
+                    film.checked = 1
                     db.session.commit()
                     msg = 'Re-uploading bannered poster.'
                     return msg
@@ -1175,8 +1168,8 @@ def restore_seasons(app):
         from app.models import Plex, season_table
         from app import db, module
         tmdbtvs = Season()
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         def run_script():
             advanced_filters = {
                 'or':[
@@ -1195,7 +1188,7 @@ def restore_seasons(app):
                         i.uploadPoster(filepath=b_file)
                         row = r[0].id
                         film = season_table.query.get(row)
-                        film.checked = '0'
+                        film.checked = 0
                         db.session.commit()
                     except (TypeError, IndexError, FileNotFoundError, plexapi.exceptions.BadRequest) as e:
                         logger.error(repr(e)) 
@@ -1242,8 +1235,9 @@ def restore_seasons(app):
 def restore_single_season(app, var):
         from app.models import Plex, season_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         def run_script():
             for i in tv.search(guid=var, libtype='season', limit=1):
                 title = i.title
@@ -1258,7 +1252,7 @@ def restore_single_season(app, var):
                     i.uploadPoster(filepath=b_file)
                     row = r[0].id
                     film = season_table.query.get(row)
-                    film.checked = '0'
+                    film.checked = 0
                     db.session.commit()
                 except (TypeError, IndexError, FileNotFoundError) as e:
                     logger.error(repr(e)) 
@@ -1283,8 +1277,9 @@ def restore_single_season(app, var):
 def restore_single_bannered_season(app, var):
         from app.models import Plex, season_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         msg = 'no message'
         def run_script():
             for season in tv.search(guid=var, libtype='season'):
@@ -1298,7 +1293,7 @@ def restore_single_bannered_season(app, var):
                     season.uploadPoster(filepath=b_file)
                     row = r[0].id
                     film = season_table.query.get(row)
-                    film.checked = '1'
+                    film.checked = 1
                     db.session.commit()
                     msg = 'Re-uploading bannered poster.'
                     return msg
@@ -1331,8 +1326,9 @@ def restore_single_bannered_season(app, var):
 def restore_single_bannered_episode(app, var):
         from app.models import Plex, ep_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         msg = 'no message'
         def run_script():
             for i in tv.search(guid=var, libtype='episode'):
@@ -1347,7 +1343,7 @@ def restore_single_bannered_episode(app, var):
                     i.uploadPoster(filepath=b_file)
                     row = r[0].id
                     film = ep_table.query.get(row)
-                    film.checked = '1'
+                    film.checked = 1
                     db.session.commit()
                     msg = 'Re-uploading bannered poster.'
                     return msg
@@ -1380,8 +1376,9 @@ def restore_single_bannered_episode(app, var):
 def hide4k(app):
     with app.app_context(): 
         from app.models import Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api
         def run_script():
 
@@ -1430,11 +1427,12 @@ def hide4k(app):
 def fresh_hdr_posters(app):
     with app.app_context(): 
         from app.models import Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api
 
-        plex = PlexServer(config.plexurl, config.token)
+        plex = module.get_plex_server(config)
         films = plex.library.section(config.filmslibrary)
         def continue_fresh_posters():
             logger.info("Restore-posters: Restore backup posters starting now") 
@@ -1476,7 +1474,7 @@ def fresh_hdr_posters(app):
             posters4k(app, '')
         def check_connection():
             try:
-                plex = PlexServer(config.plexurl, config.token)
+                plex = module.get_plex_server(config)
             except requests.exceptions.ConnectionError as e:
                 logger.error(e)
                 logger.error('Cannot connect to your plex server. Please double check your config is correct.')
@@ -1488,11 +1486,12 @@ def autocollections(app):
     with app.app_context(): 
         logger.info('Autocollections has started')
         from app.models import Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api
 
-        plex = PlexServer(config.plexurl, config.token)
+        plex = module.get_plex_server(config)
 
         def run_script():
             def popular():
@@ -1716,8 +1715,9 @@ def test_script(app):
     with app.app_context(): 
         from app.models import Plex, film_table
         from app import db
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         films = plex.library.section('films')
 
         for i in films.search(resolution='4k', hdr=False):
@@ -1727,7 +1727,7 @@ def test_script(app):
                 print(i.title)
                 row = r[0].id
                 film = film_table.query.get(row)
-                film.checked = '0'
+                film.checked = 0
                 db.session.commit()
 
 def fill_database(app):
@@ -1735,8 +1735,8 @@ def fill_database(app):
         from app.models import Plex, film_table
         from app import db
         from app import module
-        config = Plex.query.filter()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api
         def run_script():
             def main():
@@ -1774,46 +1774,6 @@ def fill_database(app):
                     except TypeError:
                         logger.info("RESTORE: "+i.title+" This poster could not be found on TheMoviedb")
                         pass                            
-                def scan_files(config, i, plex):
-                        try:
-                            logger.debug('Scanning '+i.title)
-                            file = re.sub(config.plexpath, '/films', i.media[0].parts[0].file)
-                            m = MediaInfo.parse(file, output='JSON')
-                            x = json.loads(m)
-                            hdr_version = module.get_plex_hdr(i, plex)
-                            if hdr_version != 'none':
-                                try:
-                                    hdr_version = x['media']['track'][1]['HDR_Format_String']
-                                except (KeyError, IndexError):
-                                    if "dolby" not in str.lower(hdr_version):
-                                        try:
-                                            hdr_version = x['media']['track'][1]['HDR_Format_Commercial']
-                                        except (KeyError, IndexError):
-                                            try:
-                                                hdr_version = x['media']['track'][1]['HDR_Format_Commercial_IfAny']
-                                            except (KeyError, IndexError):
-                                                pass
-                            audio = ""
-                            try:
-                                while True:
-                                    for f in range(10):
-                                        if 'Audio' in x['media']['track'][f]['@type']:
-                                            if 'Format_Commercial_IfAny' in x['media']['track'][f]:
-                                                audio = x['media']['track'][f]['Format_Commercial_IfAny']
-                                                if 'XLL X' in x['media']['track'][f]["Format_AdditionalFeatures"]:
-                                                    audio = 'DTS:X'
-                                                break
-                                            elif 'Format' in x['media']['track'][f]:
-                                                audio = x['media']['track'][f]['Format']
-                                                break
-                                    if audio != "":
-                                        break
-                            except (IndexError, KeyError) as e:
-                                logger.debug(i.title+' '+repr(e))
-                            return audio, hdr_version
-                        except FileNotFoundError as e:
-                            logger.error(repr(e))
-
                 def insert_intoTable(hdr, audio, tmp_poster):
                     logger.debug('Adding '+i.title+' to database') 
                     logger.debug(i.title+' '+hdr+' '+audio)  
@@ -1822,14 +1782,12 @@ def fill_database(app):
                     logger.debug(tmp_poster)
                     if True in banners:
                         b_poster = '/config/backup/bannered_films/'+t+'.png'
-                        shutil.copy(tmp_poster, b_poster)
+                        module.copy_backup(tmp_poster, b_poster)
                         bannered_poster = re.sub('/config', 'static', b_poster)
                     else:
                         bannered_poster = ''
                     if not r:
-                        film = film_table(title=title, guid=guid, guids=guids, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, bannered_poster=bannered_poster)
-                        db.session.add(film)   
-                        db.session.commit()
+                        module.queue_write(db, film_table, guid, insert=True, title=title, guids=guids, size=size, res=res, hdr=hdr, audio=audio, poster=b_file, bannered_poster=bannered_poster)
                     elif r[0].size != size:
                         updateTable(hdr, audio, tmp_poster)
 
@@ -1844,14 +1802,7 @@ def fill_database(app):
                     b_file = backup_poster(tmp_poster)
                     #b_file = re.sub('/config', 'static', pblob)
                     if backup == True or True not in banners:
-                        row = r[0].id
-                        film = film_table.query.get(row)
-                        film.size = size
-                        film.res = res
-                        film.hdr = hdr
-                        film.audio = audio
-                        film.poster = b_file
-                        db.session.commit()
+                        module.queue_write(db, film_table, guid, size=size, res=res, hdr=hdr, audio=audio, poster=b_file)
 
                 def backup_poster(tmp_poster):
                     if config.manualplexpath == 1:
@@ -1866,16 +1817,16 @@ def fill_database(app):
                         logger.debug(bak_file)
                         b_file = b_dir+'films/'+t+'.png'
                         logger.debug(b_file)
-                        shutil.copy(bak_file, b_file)
+                        module.copy_backup(bak_file, b_file)
 
                     elif True not in banners:
                         logger.debug(i.title+" No banners detected so adding backup file to database")
                         b_file = b_dir+'films/'+t+'.png'
-                        shutil.copy(tmp_poster, b_file)
+                        module.copy_backup(tmp_poster, b_file)
                     elif (True in banners and old_backup == False and config.tmdb_restore == 1):
                         b_file = b_dir+'films/'+t+'.png'
                         tmdb_poster = restore_tmdb()
-                        shutil.copy(tmdb_poster, b_file)
+                        module.copy_backup(tmdb_poster, b_file)
                     return b_file
 
                 def check_banners(tmp_poster):
@@ -1927,29 +1878,15 @@ def fill_database(app):
                     poster_hdr_hash = imagehash.average_hash(hdrchk)
 
                     # General Hashes
-                    chk_banner = Image.open("app/img/chk-4k.png")
-                    chk_banner_hash = imagehash.average_hash(chk_banner)
-
-                    chk_mini_banner = Image.open("app/img/chk-mini-4k2.png")
-                    chk_mini_banner_hash = imagehash.average_hash(chk_mini_banner)
-
-                    chk_hdr = Image.open("app/img/chk_hdr.png")
-                    chk_hdr_hash = imagehash.average_hash(chk_hdr)
-
-                    chk_dolby_vision = Image.open("app/img/chk_dolby_vision.png")
-                    chk_dolby_vision_hash = imagehash.average_hash(chk_dolby_vision)
-
-                    chk_hdr10 = Image.open("app/img/chk_hdr10.png")
-                    chk_hdr10_hash = imagehash.average_hash(chk_hdr10)
-
-                    chk_new_hdr = Image.open("app/img/chk_hdr_new.png")
-                    chk_new_hdr_hash = imagehash.average_hash(chk_new_hdr)
-
-                    atmos_box = Image.open("app/img/chk_atmos.png")
-                    chk_atmos_hash = imagehash.average_hash(atmos_box)
-
-                    dtsx_box = Image.open("app/img/chk_dtsx.png")
-                    chk_dtsx_hash = imagehash.average_hash(dtsx_box)
+                    chk = module.get_reference_hashes()['film']
+                    chk_banner_hash = chk['banner']
+                    chk_mini_banner_hash = chk['mini_banner']
+                    chk_hdr_hash = chk['hdr']
+                    chk_dolby_vision_hash = chk['dolby_vision']
+                    chk_hdr10_hash = chk['hdr10']
+                    chk_new_hdr_hash = chk['new_hdr']
+                    chk_atmos_hash = chk['atmos']
+                    chk_dtsx_hash = chk['dtsx']
 
                     wide_banner = mini_banner = audio_banner = hdr_banner = old_hdr = False
 
@@ -1973,23 +1910,6 @@ def fill_database(app):
                     background.save(tmp_poster)
                     return wide_banner, mini_banner, audio_banner, hdr_banner, old_hdr
 
-                def get_plex_hdr(i, plex):
-                    ekey = i.key
-                    m = plex.fetchItems(ekey)
-                    for m in m:
-                        try:
-                            if m.media[0].parts[0].streams[0].DOVIPresent == True:
-                                hdr_version='Dolby Vision'
-                                i.addLabel('Dolby Vision', locked=False)
-                            elif 'HDR' in m.media[0].parts[0].streams[0].displayTitle:
-                                hdr_version='HDR'
-                                i.addLabel('HDR', locked=False)
-                            else:
-                                hdr_version = 'None'
-                            return hdr_version
-                        except IndexError:
-                            pass
-
                 def get_poster():
                     logger.debug(i.title+' Getting poster')
                     imgurl = plex.transcodeImage(
@@ -2037,26 +1957,29 @@ def fill_database(app):
                             audio = ''
                         insert_intoTable(hdr, audio, tmp_poster)  
                 
-            for i in films.search():
-                logger.debug(i.title)
-                title = i.title
-                guid = str(i.guid)
-                guids = str(i.guids)
-                size = i.media[0].parts[0].size
-                res = i.media[0].videoResolution
-                r = film_table.query.filter(film_table.guid == guid).all()
-                if not r:
-                    main()
-                else:
-                    if r[0].size != size:
-                        logger.info(title+' is already in the database')
-                    else:
+            rows = module.preload_rows(film_table, db)
+            with module.batched_writes(db):
+                for i in films.search():
+                    logger.debug(i.title)
+                    title = i.title
+                    guid = str(i.guid)
+                    guids = str(i.guids)
+                    size = i.media[0].parts[0].size
+                    res = i.media[0].videoResolution
+                    r = module.lookup_rows(rows, film_table, guid)
+                    if not r:
                         main()
+                    else:
+                        if r[0].size == size:
+                            logger.info(title+' is already in the database')
+                        else:
+                            main()
             try:
                 row = config.id
                 plex_utills = Plex.query.get(row)
                 plex_utills.migrated = '1'
                 db.session.commit()
+                module.invalidate_config()
             except Exception as e:
                 logger.error(repr(e))
                 db.session.rollback()
@@ -2082,8 +2005,9 @@ def add_labels(app):
     with app.app_context(): 
 
         from app.models import Plex, film_table
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        from app import module
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         def run_script():
             logger.info('Adding Film Labels')
             for i in films.search(sort='random'):
@@ -2113,12 +2037,17 @@ def add_labels(app):
             except IndexError:
                 pass 
 
+def refresh_catalog(app):
+    with app.app_context():
+        from app import module
+        module.refresh_catalog(module.get_config())
+
 def maintenance(app):
     with app.app_context():
         from app.models import Plex, film_table, ep_table, season_table
         from app import db, module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         try:
 
             plex.runButlerTask('CleanOldCacheFiles')
@@ -2150,11 +2079,13 @@ def maintenance(app):
 
                 logger.warning(f"Butler task 'CleanOldBundles' failed: {e}")
         
-        def clean_database(table, library):
+        def clean_database(table, libraries, libtype=None):
+            guids = set()
+            for library in libraries:
+                guids.update(str(m.guid) for m in library.search(libtype=libtype))
             r = table.query.all()
             for i in r:
-                f = library.search(guid=i.guid)
-                if f:
+                if i.guid in guids:
                     pass
                     #print(f.title+" exists")
                 else:
@@ -2179,9 +2110,7 @@ def maintenance(app):
         n = len(lib)
         if n <= 2:
             try:
-                for l in range(n):
-                    films = plex.library.section(lib[l])
-                    clean_database(film_table, films)
+                clean_database(film_table, [plex.library.section(lib[l]) for l in range(n)])
             except IndexError:
                 pass
         
@@ -2199,10 +2128,9 @@ def maintenance(app):
             
             if tv_features_enabled and tv_n <= 2:
                 try:
-                    for l in range(tv_n):  # Use actual number of TV libraries
-                        tv = plex.library.section(tvlib_list[l])  # Use correct TV library variable
-                        clean_database(ep_table, tv)
-                        clean_database(season_table, tv)
+                    tv = [plex.library.section(tvlib_list[l]) for l in range(tv_n)]  # Use correct TV library variable
+                    clean_database(ep_table, tv, 'episode')
+                    clean_database(season_table, tv, 'season')
                 except IndexError:
                     pass
             else:
@@ -2211,6 +2139,20 @@ def maintenance(app):
             logger.info("No TV library configured, skipping TV database cleanup")
 
         module.clear_old_posters()
+        store_backups(app)
+
+def store_backups(app):
+    """Move the backup tree into the blob store and delete blobs nothing links to"""
+    with app.app_context():
+        from app import module
+        from app.blobs import backup_files, prune_blobs
+        module.get_config()
+        stored = 0
+        for path in backup_files():
+            if module.store_backup(path):
+                stored += 1
+        removed = prune_blobs()
+        logger.info('Backup store: '+str(stored)+' files stored, '+str(removed)+' unused blobs removed')
 
 def collective4k(app):
     with app.app_context(): 
@@ -2218,7 +2160,8 @@ def collective4k(app):
         from time import sleep
         sleep(5)
         from app.models import Plex
-        config = Plex.query.filter(Plex.id == '1').first()
+        from app import module
+        config = module.get_config()
         if config.tv4kposters == 1:
             logger.info('Starting 4k Tv poster script')
             tv_episode_poster(app, '', '')
@@ -2227,11 +2170,11 @@ def restore_posters(app):
     with app.app_context(): 
         from app.models import Plex, film_table
         from app import db, module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api   
 
-        plex = PlexServer(config.plexurl, config.token)
+        plex = module.get_plex_server(config)
         size = (2000,3000)
         bannerbox= (0,0,2000,246)
         mini_box = (0,0,350,275)
@@ -2255,7 +2198,7 @@ def restore_posters(app):
                         module.get_tmdb_poster(fname, poster)
                         i.uploadPoster(filepath=fname)
                         if r:
-                            shutil.copy('tmdb_poster_restore.png', re.sub('static', '/config', r[0].poster))
+                            module.copy_backup('tmdb_poster_restore.png', re.sub('static', '/config', r[0].poster))
                         os.remove
                     except TypeError:
                         logger.info("RESTORE: "+i.title+" This poster could not be found on TheMoviedb")
@@ -2267,7 +2210,8 @@ def restore_posters(app):
                         i.uploadPoster(filepath=poster)
 
 
-                for i in films.search(sort='titleSort', title=''):
+                items = films.search(sort='titleSort', title='')
+                for i in items:
                     try:
                         i.title = unicodedata.normalize('NFD', i.title).encode('ascii', 'ignore').decode('utf8')
                         newdir = os.path.dirname(re.sub(config.plexpath, '/films', i.media[0].parts[0].file))+'/'
@@ -2292,7 +2236,7 @@ def restore_posters(app):
                                     restore_tmdb()
                                 row = r[0].id
                                 film = film_table.query.get(row)
-                                film.checked = '0'
+                                film.checked = 0
                                 db.session.commit()                                
                             except Exception as e:
                                 logger.error("Can't restore poster from database: "+repr(e))
@@ -2309,10 +2253,7 @@ def restore_posters(app):
                                 hdr = module.get_plex_hdr(i, plex)
                                 if (True in banners and (i.media[0].videoResolution  == '4k' or hdr != 'None')):
                                     restore_tmdb()
-                                try:
-                                    os.remove(tmp_poster)
-                                except:
-                                    pass
+                                module.remove_tmp_files(tmp_poster)
                             except AttributeError as e:
                                 logger.warning("Can't get the poster from Plex, restoring from TMDB: "+repr(e))
                                 restore_tmdb()
@@ -2322,13 +2263,14 @@ def restore_posters(app):
 
             def check_connection():
                 try:
-                    plex = PlexServer(config.plexurl, config.token)
+                    plex = module.get_plex_server(config)
                 except requests.exceptions.ConnectionError as e:
                     logger.error(e)
                     logger.error('Cannot connect to your plex server. Please double check your config is correct.')
                 else:
                     continue_restore()                
             check_connection()
+            module.clear_stream_info()
 
             for i in films.search():
                 i.title = unicodedata.normalize('NFD', i.title).encode('ascii', 'ignore').decode('utf8')
@@ -2358,8 +2300,8 @@ def spoilers(app, guid):
         from app.models import Plex, ep_table
         from app import db
         from app import module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tv = plex.library.section(config.tvlibrary)
         size = (1280,720)
         cutoff = 10
@@ -2396,7 +2338,7 @@ def spoilers(app, guid):
 
                             row = r[0].id
                             film = table.query.get(row)
-                            film.checked = '0'
+                            film.checked = 0
                             db.session.commit()
                             if res == '4k' or hdr != 'None':
                                 tv_episode_poster(app, guid, poster)
@@ -2419,8 +2361,8 @@ def spoilers(app, guid):
                             i.uploadPoster(filepath=tmp_poster)
                             row = r[0].id
                             film = table.query.get(row)
-                            film.blurred = '0'
-                            film.checked = '0'
+                            film.blurred = 0
+                            film.checked = 0
                             db.session.commit()
                             tv_episode_poster(app, guid, poster)
                     else:
@@ -2433,8 +2375,8 @@ def get_tv_guid(tv_show, season, episode):
         from app.models import Plex, ep_table
         from app import db
         from app import module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tv = plex.library.section(config.tvlibrary)
         for ep in tv.search(filters={"show.title":tv_show, "episode.index":episode, "season.index":season}):
             return ep.guid
@@ -2482,8 +2424,8 @@ def sync_ratings(app):
     with app.app_context():        
         from app.models import Plex
         from app import module
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         tmdb.api_key = config.tmdb_api
         films = plex.library.section('Films')
         for i in films.search():
@@ -2556,8 +2498,9 @@ def backup_poster_check(app):
 
 def get_tmdb_show_posters(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     tmdbtvs = TV()
     def run_script():
         posters = []
@@ -2598,8 +2541,9 @@ def get_tmdb_show_posters(var):
 
 def get_tmdb_season_posters(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     
     # Check if TV library is configured
     tvlib = config.tvlibrary
@@ -2647,8 +2591,9 @@ def get_tmdb_season_posters(var):
 
 def get_tmdb_episode_posters(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     
     # Check if TV library is configured
     tvlib = config.tvlibrary
@@ -2698,8 +2643,9 @@ def get_tmdb_episode_posters(var):
 
 def get_tmdb_film_posters(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     tmdb = Movie()
     def run_script():
         posters = []
@@ -2736,8 +2682,8 @@ def upload_tmdb_season(app, var):
 
         from app import db, module
         from app.models import season_table, ep_table, Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         size = (2000,3000)
         parts = var.split('&')
         guid = parts[1]
@@ -2747,13 +2693,12 @@ def upload_tmdb_season(app, var):
             try:
                 for e in tv.search(libtype='episode', filters={"season.guid":guid}):
                     hdr = 'None'
-                    ekey = e.key
                     title = e.grandparentTitle
-                    for m in plex.fetchItems(ekey):
-                        if m.media[0].parts[0].streams[0].DOVIPresent == True:
-                            hdr='Dolby Vision'
-                        elif 'HDR' in m.media[0].parts[0].streams[0].displayTitle:
-                            hdr='HDR'
+                    info = module.get_stream_info(e, plex)
+                    if info and info['dovi']:
+                        hdr='Dolby Vision'
+                    elif info and 'HDR' in info['display_title']:
+                        hdr='HDR'
                     res = e.media[0].videoResolution
                     t = re.sub('plex://season/', '', guid)
                     tmp_poster = re.sub(' ','_', '/tmp/'+t+'_poster.png')
@@ -2762,11 +2707,11 @@ def upload_tmdb_season(app, var):
 
                     if (hdr != 'None' or res == '4k'):
                         s_bak = '/config/backup/tv/seasons/'+t+'.png'
-                        shutil.copy(season_poster, s_bak)
+                        module.copy_backup(season_poster, s_bak)
                         s_banners = module.check_banners(season_poster, size)
                         module.season_decision_tree(config, s_banners, e, hdr, res, season_poster)
                         banner_file = '/config/backup/tv/bannered_seasons/'+t+'.png'
-                        shutil.copy(season_poster, banner_file)
+                        module.copy_backup(season_poster, banner_file)
                         if os.path.exists(banner_file) != True:
                             raise Exception("Season poster has not copied")
                         table = season_table
@@ -2805,8 +2750,8 @@ def upload_tmdb_season(app, var):
 def upload_tmdb_film(app, var):
         from app import db, module
         from app.models import film_table, Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         size = (2000,3000)
         parts = var.split('&')
         guid = parts[1]
@@ -2830,7 +2775,7 @@ def upload_tmdb_film(app, var):
                         tmp_poster = re.sub(' ','_', '/tmp/'+t+'_poster.png')
                         film_poster = module.get_tmdb_poster(tmp_poster, poster)
                         film_bak = '/config/backup/films/'+t+'.png'
-                        shutil.copy(film_poster, film_bak)
+                        module.copy_backup(film_poster, film_bak)
                         if os.path.exists(film_bak) != True:
                             raise Exception("Film poster has not copied")
                         film_banners = module.check_banners(film_poster, size)
@@ -2839,7 +2784,7 @@ def upload_tmdb_film(app, var):
 
 
                         module.upload_poster(film_poster, title, db, r, film_table, film, banner_file)
-                        shutil.copy(film_poster, banner_file)
+                        module.copy_backup(film_poster, banner_file)
                         module.remove_tmp_files(film_poster)
                         break
                     else: posters4k(app, film.title, poster)
@@ -2861,8 +2806,8 @@ def upload_tmdb_film(app, var):
 def upload_tmdb_episode(app, var):
         from app import db, module
         from app.models import season_table, ep_table, Plex
-        config = Plex.query.filter(Plex.id == '1').first()
-        plex = PlexServer(config.plexurl, config.token)
+        config = module.get_config()
+        plex = module.get_plex_server(config)
         size = (1280,720)
         parts = var.split('&')
         guid = parts[1]
@@ -2894,13 +2839,13 @@ def upload_tmdb_episode(app, var):
                     episode_poster = module.get_tmdb_poster(tmp_poster, poster)
                     if (hdr != 'none' or resolution == '4k' or audio != ''):
                         ep_bak = '/config/backup/tv/episodes/'+t+'.png'
-                        shutil.copy(episode_poster, ep_bak)
+                        module.copy_backup(episode_poster, ep_bak)
                         if os.path.exists(ep_bak) != True:
                             raise Exception("Season poster has not copied")
                         ep_banners = module.check_banners(episode_poster, size)
                         module.tv_banner_decision(e, tmp_poster, ep_banners, audio, hdr, resolution, size)
                         banner_file = '/config/backup/tv/bannered_episodes/'+t+'.png'
-                        shutil.copy(episode_poster, banner_file)
+                        module.copy_backup(episode_poster, banner_file)
                         title = e.grandparentTitle
                         table = ep_table
                         episode = e.index
@@ -2941,8 +2886,9 @@ def upload_tmdb_episode(app, var):
 def get_film_posters():
 
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     from app.items import Film
     films = []
     def run_script():
@@ -2964,8 +2910,9 @@ def get_film_posters():
 
 def get_shows():
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     from app.items import Shows
     shows = []
     
@@ -3009,8 +2956,9 @@ def get_shows():
 
 def get_tv_seasons(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     
     # Check if TV library is configured
     tvlib = config.tvlibrary
@@ -3054,8 +3002,9 @@ def get_tv_seasons(var):
   
 def get_tv_episodes(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     
     # Check if TV library is configured
     tvlib = config.tvlibrary
@@ -3099,8 +3048,9 @@ def get_tv_episodes(var):
 
 def get_season_posters(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     
     # Check if TV library is configured
     tvlib = config.tvlibrary
@@ -3144,8 +3094,9 @@ def get_season_posters(var):
 
 def get_episode_posters(var):
     from app.models import Plex
-    config = Plex.query.filter(Plex.id == '1').first()
-    plex = PlexServer(config.plexurl, config.token)
+    from app import module
+    config = module.get_config()
+    plex = module.get_plex_server(config)
     
     # Check if TV library is configured
     tvlib = config.tvlibrary
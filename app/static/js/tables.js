@@ -0,0 +1,48 @@
+// Cell renderers for the films, episodes and seasons tables.
+// The /api endpoints return plain row fields; the markup is built here.
+
+function escapeHtml(value) {
+  return String(value == null ? '' : value)
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;')
+    .replace(/'/g, '&#39;');
+}
+
+function displayOnly(render) {
+  return function (data, type, row) {
+    return type === 'display' ? render(data, row) : data;
+  };
+}
+
+function renderPoster(restore) {
+  return displayOnly(function (data, row) {
+    return '<a href="restore/' + restore + '/' + escapeHtml(row.guid) + '"><img height=100px src="' + escapeHtml(data) + '"></a>';
+  });
+}
+
+function renderButton(href, style, icon, label) {
+  return '<a href="' + escapeHtml(href) + '" class="btn ' + style + ' btn-icon-split">' +
+    '<span class="icon text-white-50"><i class="fas ' + icon + '"></i></span>' +
+    (label ? '<span class="text">' + escapeHtml(label) + '</span>' : '') +
+    '</a>';
+}
+
+function renderRerun(path, withTitle) {
+  return displayOnly(function (data, row) {
+    return renderButton(path + row.guid, 'btn-secondary', 'fa-undo-alt', withTitle ? row.title : '');
+  });
+}
+
+function renderDelete(kind) {
+  return displayOnly(function (data, row) {
+    return renderButton('/delete_row/' + kind + '/' + row.guid, 'btn-danger', 'fa-exclamation-triangle', '');
+  });
+}
+
+var renderLink = displayOnly(function (data, row) {
+  return row.url ? '<a href="' + escapeHtml(row.url) + '">' + escapeHtml(data) + '</a>' : escapeHtml(data);
+});
+
+var renderText = $.fn.dataTable.render.text();
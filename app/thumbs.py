@@ -0,0 +1,56 @@
+import os
+import re
+from PIL import Image
+from app.blobs import temp_path
+
+backup_dir = '/config/backup/'
+thumb_dir = '/config/backup/thumbs/'
+thumb_url_base = '/thumbs/'
+thumb_height = 200
+thumb_quality = 80
+source_extensions = ('.png', '.jpg', '.jpeg', '.webp')
+
+def thumb_name(poster):
+    """Thumbnail name for a backup poster path, None for posters outside the backup folder"""
+    path = re.sub('^/?static/', '/config/', poster or '')
+    if not path.startswith(backup_dir) or path.startswith(thumb_dir):
+        return None
+    return os.path.splitext(path[len(backup_dir):])[0]+'.webp'
+
+def thumb_url(poster, stamp=None):
+    """URL of a poster's thumbnail, versioned by the stored hash so it can be cached for good"""
+    name = thumb_name(poster)
+    if not name:
+        return poster
+    if stamp:
+        return thumb_url_base+name+'?v='+stamp.split(':')[0]
+    return thumb_url_base+name
+
+def write_thumbnail(image, poster):
+    """Save a small WebP copy of a decoded backup poster"""
+    name = thumb_name(poster)
+    if not name:
+        return None
+    path = thumb_dir+name
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    thumb = image.convert('RGB')
+    thumb.thumbnail((thumb_height*4, thumb_height), Image.LANCZOS)
+    # The /thumbs route and a run can write the same thumbnail at once
+    tmp = temp_path(path)
+    thumb.save(tmp, 'WEBP', quality=thumb_quality)
+    os.replace(tmp, path)
+    return path
+
+def get_thumbnail(name):
+    """Path of a thumbnail, generating it from its backup poster if it's missing"""
+    path = os.path.normpath(thumb_dir+name)
+    if not path.startswith(thumb_dir) or not path.endswith('.webp'):
+        return None
+    if os.path.exists(path):
+        return path
+    stem = backup_dir+os.path.splitext(path[len(thumb_dir):])[0]
+    for ext in source_extensions:
+        if os.path.exists(stem+ext):
+            with Image.open(stem+ext) as image:
+                return write_thumbnail(image, stem+ext)
+    return None
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from urllib.parse import urlsplit
+import httpx
+
+# Poster downloads and uploads run on one event loop per process, so a run can
+# keep many transfers in flight while its threads do the image work. Callers
+# block on the futures, or use fetch/post as a plain synchronous call.
+host_limit = 8
+total_limit = 32
+retries = 3
+backoff = 0.5
+retry_statuses = (429, 500, 502, 503, 504)
+# Other methods are only retried when the connection failed before anything was
+# sent, Plex may have taken an upload that then timed out or got a 502
+idempotent = ('GET', 'HEAD')
+# Raised by fetch, post and the futures for a transfer that failed, it isn't an OSError
+TransferError = httpx.HTTPError
+timeout = httpx.Timeout(60.0, connect=10.0)
+
+loop = None
+client = None
+host_slots = {}
+loop_lock = threading.Lock()
+
+def get_loop():
+    """Get the transfer event loop, starting its thread on first use"""
+    global loop
+    if loop is None:
+        with loop_lock:
+            if loop is None:
+                new_loop = asyncio.new_event_loop()
+                threading.Thread(target=new_loop.run_forever, name='transfers', daemon=True).start()
+                loop = new_loop
+    return loop
+
+def get_client():
+    global client
+    if client is None:
+        limits = httpx.Limits(max_connections=total_limit, max_keepalive_connections=total_limit)
+        client = httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True)
+    return client
+
+async def request(method, url, **kwargs):
+    """Send a request, holding a slot for the host and retrying with backoff on errors and busy replies"""
+    host = urlsplit(url).netloc
+    slot = host_slots.get(host)
+    if slot is None:
+        slot = host_slots.setdefault(host, asyncio.Semaphore(host_limit))
+    safe = method.upper() in idempotent
+    async with slot:
+        for attempt in range(retries+1):
+            try:
+                response = await get_client().request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt == retries:
+                    raise
+            except httpx.TransportError:
+                if not safe or attempt == retries:
+                    raise
+            else:
+                if not safe or response.status_code not in retry_statuses or attempt == retries:
+                    return response
+            await asyncio.sleep(backoff * 2**attempt)
+
+def submit(method, url, **kwargs):
+    """Start a transfer and return a concurrent.futures.Future for its response"""
+    return asyncio.run_coroutine_threadsafe(request(method, url, **kwargs), get_loop())
+
+def fetch(url, **kwargs):
+    return submit('GET', url, **kwargs).result()
+
+def post(url, **kwargs):
+    return submit('POST', url, **kwargs).result()
@@ -15,6 +15,7 @@ def sys_info():
 
 plexpath = ''
 import sqlite3
+from app.database import sqlite_connect, table_schemas, typed_columns, create_search_index, drop_search_index, search_index_current
 import shutil
 from app import log
 def continue_setup():
@@ -22,7 +23,7 @@ def continue_setup():
     def add_new_columns():
         #log.debug('Adding new Columns')
 
-        conn = sqlite3.connect("/config/app.db")
+        conn = sqlite_connect()
         c = conn.cursor()
         c.execute("SELECT * FROM plex_utills")
         config = c.fetchall()
@@ -74,6 +75,17 @@ def continue_setup():
         query16 = """ALTER TABLE plex_utills    
                 ADD COLUMN migrated INT
                 """                                                                                                    
+        column_queries = []
+        for table in ('films', 'episodes', 'seasons'):
+            for column in ('poster_hash', 'bannered_poster_hash'):
+                column_queries.append("ALTER TABLE "+table+" ADD COLUMN "+column+" TEXT")
+        for table in ('films', 'episodes'):
+            column_queries.append("ALTER TABLE "+table+" ADD COLUMN thumb TEXT")
+            column_queries.append("ALTER TABLE "+table+" ADD COLUMN updated_at INT")
+        column_queries.append("ALTER TABLE plex_utills ADD COLUMN workers INT")
+        column_queries.append("ALTER TABLE plex_utills ADD COLUMN probe_concurrency INT")
+        column_queries.append("ALTER TABLE plex_utills ADD COLUMN fast_probe INT")
+        column_queries.append("ALTER TABLE plex_utills ADD COLUMN backup_format TEXT")
         try:
             c.execute(query1)
         except sqlite3.OperationalError as e:
@@ -141,6 +153,11 @@ def continue_setup():
             c.execute(query16)
         except sqlite3.OperationalError as e:
             pass                                                              
+        for query in column_queries:
+            try:
+                c.execute(query)
+            except sqlite3.OperationalError as e:
+                pass
         try:
             api = config[0][32]
             loglevel = config[0][36]
@@ -161,6 +178,10 @@ def continue_setup():
                 c.execute("UPDATE plex_utills SET new_hdr = '1' WHERE ID = 1")
             if not migrated:
                 c.execute("UPDATE plex_utills SET migrated = '0' WHERE ID = 1")                
+            c.execute("UPDATE plex_utills SET workers = '1' WHERE ID = 1 AND workers IS NULL")
+            c.execute("UPDATE plex_utills SET probe_concurrency = '2' WHERE ID = 1 AND probe_concurrency IS NULL")
+            c.execute("UPDATE plex_utills SET fast_probe = '1' WHERE ID = 1 AND fast_probe IS NULL")
+            c.execute("UPDATE plex_utills SET backup_format = 'png' WHERE ID = 1 AND backup_format IS NULL")
             conn.commit()
         except (sqlite3.OperationalError, IndexError) as e:
             pass
@@ -180,21 +201,9 @@ def create_table():
 def add_new_table():
     #log.debug('Adding new table')
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor() 
-        table = """CREATE TABLE "films" (
-                	"ID"	INTEGER NOT NULL UNIQUE,
-                	"Title"	TEXT NOT NULL,
-                	"GUID"	TEXT NOT NULL,
-                	"GUIDS"	TEXT NOT NULL,
-                	"size"	TEXT,
-                	"res"	TEXT,
-                	"hdr"	TEXT,
-                	"audio"	TEXT,
-                	"poster"	TEXT NOT NULL,
-                	"checked"	INTEGER,
-                	PRIMARY KEY("ID" AUTOINCREMENT)
-                ); """
+        table = table_schemas['films']
         c.execute(table)
         conn.commit()
     except Exception as e:
@@ -202,24 +211,9 @@ def add_new_table():
 def add_ep_table():
     #log.debug('Adding new table')
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor() 
-        table = """CREATE TABLE "episodes" (
-                	"ID"	INTEGER NOT NULL UNIQUE,
-                    "Show_season" TEXT,
-                	"Title"	TEXT NOT NULL,
-                	"GUID"	TEXT NOT NULL,
-                	"GUIDS"	TEXT NOT NULL,
-                	"size"	TEXT,
-                	"res"	TEXT,
-                	"hdr"	TEXT,
-                	"audio"	TEXT,
-                	"poster"	TEXT NOT NULL,
-                    "bannered_poster" TEXT,
-                	"checked"	INTEGER,
-                    "blurred"   INTEGER,
-                	PRIMARY KEY("ID" AUTOINCREMENT)
-                ); """
+        table = table_schemas['episodes']
         c.execute(table)
         conn.commit()
     except Exception as e:
@@ -227,24 +221,104 @@ def add_ep_table():
 def add_season_table():
     #log.debug('Adding new table')
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor() 
-        table = """CREATE TABLE "seasons" (
-                	"ID"	INTEGER NOT NULL UNIQUE,
-                	"Title"	TEXT NOT NULL,
-                	"GUID"	TEXT NOT NULL,
-                    "poster" TEXT,
-                    "bannered_poster" TEXT,
-                    "checked" INTEGER,
-                	PRIMARY KEY("ID" AUTOINCREMENT)
-                ); """
+        table = table_schemas['seasons']
         c.execute(table)
         conn.commit()
     except Exception as e:
         pass #log.debug(repr(e)) 
+def has_unique_guid(c, table):
+    c.execute('PRAGMA index_list("'+table+'")')
+    for index in c.fetchall():
+        if index[2]:
+            c.execute('PRAGMA index_info("'+index[1]+'")')
+            if [str.lower(col[2]) for col in c.fetchall()] == ['guid']:
+                return True
+    return False
+def add_guid_indexes():
+    conn = sqlite_connect()
+    c = conn.cursor()
+    for table in ('films', 'episodes', 'seasons'):
+        try:
+            if has_unique_guid(c, table):
+                continue
+            c.execute('DELETE FROM "'+table+'" WHERE ID NOT IN (SELECT MAX(ID) FROM "'+table+'" GROUP BY GUID)')
+            c.execute('CREATE UNIQUE INDEX "ix_'+table+'_guid_unique" ON "'+table+'" ("GUID")')
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            conn.rollback() #log.debug(repr(e))
+    c.close()
+    conn.close()
+def needs_typed_columns(c, table):
+    c.execute('PRAGMA table_info("'+table+'")')
+    info = {str.lower(col[1]): col for col in c.fetchall()}
+    if 'size' in info and str.upper(info['size'][2]) != 'INTEGER':
+        return True
+    return 'checked' in info and info['checked'][4] is None
+def table_exists(c, table):
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return c.fetchone() is not None
+def copy_typed_rows(c, table):
+    c.execute('PRAGMA table_info("'+table+'_old")')
+    old_columns = {str.lower(col[1]) for col in c.fetchall()}
+    c.execute('PRAGMA table_info("'+table+'")')
+    columns = [col[1] for col in c.fetchall() if str.lower(col[1]) in old_columns]
+    values = [typed_columns.get(str.lower(col), '"'+col+'"') for col in columns]
+    c.execute('INSERT OR IGNORE INTO "'+table+'" ('+', '.join('"'+col+'"' for col in columns)+') SELECT '+', '.join(values)+' FROM "'+table+'_old" ORDER BY ID DESC')
+    c.execute('DROP TABLE "'+table+'_old"')
+def migrate_typed_columns():
+    conn = sqlite_connect()
+    # Manage the transaction by hand, the sqlite3 module would commit the DDL as it went
+    conn.isolation_level = None
+    c = conn.cursor()
+    for table in ('films', 'episodes', 'seasons'):
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            if table_exists(c, table+'_old'):
+                # Left behind by a migration that was cut short before it ran in one transaction
+                if not table_exists(c, table):
+                    c.execute(table_schemas[table])
+                copy_typed_rows(c, table)
+            elif needs_typed_columns(c, table):
+                c.execute('ALTER TABLE "'+table+'" RENAME TO "'+table+'_old"')
+                c.execute(table_schemas[table])
+                copy_typed_rows(c, table)
+            c.execute('COMMIT')
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                c.execute('ROLLBACK') #log.debug(repr(e))
+    c.close()
+    conn.close()
+def add_catalog_tables():
+    conn = sqlite_connect()
+    for table in ('library_catalog', 'catalog_state'):
+        try:
+            if not conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                conn.execute(table_schemas[table])
+                conn.commit()
+        except sqlite3.OperationalError as e:
+            conn.rollback() #log.debug(repr(e))
+    try:
+        conn.execute('ALTER TABLE catalog_state ADD COLUMN "lease_until" INTEGER')
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        pass #log.debug(repr(e))
+    conn.close()
+def add_search_indexes():
+    conn = sqlite_connect()
+    for table in ('films', 'episodes', 'seasons', 'library_catalog'):
+        try:
+            if not search_index_current(conn, table):
+                # Indexes from before the trigram tokenizer only matched word prefixes
+                drop_search_index(conn, table)
+                create_search_index(conn, table)
+        except sqlite3.OperationalError as e:
+            conn.rollback() #log.debug(repr(e))
+    conn.close()
 def table_check():
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor()
         c.execute("SELECT * FROM plex_utills")
         c.close()
@@ -253,7 +327,7 @@ def table_check():
         #log.debug(repr(e))
         create_table()
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor()
         c.execute("SELECT * FROM films")
         c.close()
@@ -262,7 +336,7 @@ def table_check():
         #log.debug(repr(e))
         add_new_table() 
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor()
         c.execute("SELECT * FROM episodes")
         try:
@@ -292,7 +366,7 @@ def table_check():
         #log.debug(repr(e))
         add_ep_table()    
     try:
-        conn = sqlite3.connect('/config/app.db')
+        conn = sqlite_connect()
         c = conn.cursor()
         c.execute("SELECT * FROM seasons")
         c.close()
@@ -300,6 +374,10 @@ def table_check():
     except sqlite3.OperationalError as e:
         pass #log.debug(repr(e))
         add_season_table()                                  
+    add_guid_indexes()
+    migrate_typed_columns()
+    add_catalog_tables()
+    add_search_indexes()
 log.debug('Running setup Helper')
 table_check()
 from app import log